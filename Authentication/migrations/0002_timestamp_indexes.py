@@ -0,0 +1,29 @@
+# Generated by Django 4.1.4 on 2026-10-17 22:07
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Authentication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='email_otp',
+            name='created_time',
+            field=models.DateTimeField(db_index=True, default=datetime.datetime(1000, 1, 1, 0, 0)),
+        ),
+        migrations.AlterField(
+            model_name='signupuser',
+            name='token_generated_at',
+            field=models.DateTimeField(db_index=True, default=datetime.datetime(1000, 1, 1, 0, 0)),
+        ),
+        migrations.AlterField(
+            model_name='two_factor_otp',
+            name='created_time',
+            field=models.DateTimeField(db_index=True, default=datetime.datetime(1000, 1, 1, 0, 0)),
+        ),
+    ]
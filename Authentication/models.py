@@ -73,13 +73,13 @@ class Two_Factor_Verification(Model):
 class Two_Factor_OTP(Model):
     phone_number = OneToOneField(Two_Factor_Verification, on_delete=CASCADE, related_name='twofactorotp')
     otp = IntegerField(blank=True, null=True)
-    created_time = DateTimeField(default=datetime.datetime(1000, 1, 1, 0, 0, 0))
+    created_time = DateTimeField(default=datetime.datetime(1000, 1, 1, 0, 0, 0), db_index=True)
 
 
 class Email_OTP(Model):
     user = OneToOneField(User, on_delete=CASCADE, related_name='emailotp')
     otp = IntegerField(blank=True, null=True)
-    created_time = DateTimeField(default=datetime.datetime(1000, 1, 1, 0, 0, 0))
+    created_time = DateTimeField(default=datetime.datetime(1000, 1, 1, 0, 0, 0), db_index=True)
 
 
 class SignUpUser(Model):
@@ -87,4 +87,4 @@ class SignUpUser(Model):
     password = CharField(max_length=255)
     token = UUIDField()
     is_verified = BooleanField(default=False)
-    token_generated_at = DateTimeField(default=datetime.datetime(1000, 1, 1, 0, 0, 0))
\ No newline at end of file
+    token_generated_at = DateTimeField(default=datetime.datetime(1000, 1, 1, 0, 0, 0), db_index=True)
\ No newline at end of file
@@ -6,7 +6,7 @@ from twilio.rest import Client
 from django.conf import settings
 from datetime import timedelta
 from django.utils import timezone
-from .models import SignUpUser, Email_OTP, Two_Factor_OTP
+from .models import SignUpUser, Email_OTP, Two_Factor_OTP, Two_Factor_Verification
 
 
 @shared_task(bind = True)
@@ -36,29 +36,22 @@ def send_sms_through_celery(self, otp, recepient):
 
 @shared_task(bind=True)
 def delete_sign_up_users(self):
-    users = SignUpUser.objects.all()
-    for user in users:
-        if user.token_generated_at + timedelta(minutes=15) < timezone.now():
-            user.delete()
-    return "DELETED SIGN UP USERS"
+    count, _ = SignUpUser.objects.filter(token_generated_at__lt=timezone.now() - timedelta(minutes=15)).delete()
+    return f"DELETED {count} SIGN UP USERS"
 
 
 @shared_task(bind=True)
 def delete_email_otps(self):
-    otps = Email_OTP.objects.all()
-    for otp in otps:
-        if otp.created_time + timedelta(minutes=5) < timezone.now():
-            otp.delete()
-    return "DELETED EMAIL OTPs"
+    count, _ = Email_OTP.objects.filter(created_time__lt=timezone.now() - timedelta(minutes=5)).delete()
+    return f"DELETED {count} EMAIL OTPs"
 
 
 @shared_task(bind=True)
 def delete_sms_otps(self):
-    otps = Two_Factor_OTP.objects.all()
-    for otp in otps:
-        if otp.created_time + timedelta(minutes=2) < timezone.now():
-            if not otp.phone_number.verified:
-                otp.phone_number.delete()
-            else:
-                otp.delete()
-    return "DELETED SMS OTPs"
\ No newline at end of file
+    # an expired OTP of an unverified number removes the number with it, of a verified number only the OTP
+    cutoff = timezone.now() - timedelta(minutes=2)
+    _, deleted = Two_Factor_Verification.objects.filter(verified=False, twofactorotp__created_time__lt=cutoff).delete()
+    numbers = deleted.get(Two_Factor_Verification._meta.label, 0)
+    otps = deleted.get(Two_Factor_OTP._meta.label, 0)
+    otps += Two_Factor_OTP.objects.filter(created_time__lt=cutoff).delete()[0]
+    return f"DELETED {otps} SMS OTPs, {numbers} UNVERIFIED NUMBERS"
\ No newline at end of file
@@ -1,3 +1,36 @@
+from datetime import timedelta
+from unittest import skipUnless
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from .models import Email_OTP, Two_Factor_OTP, SignUpUser, Two_Factor_Verification
 
-# Create your tests here.
+
+class QueryPlanMixin:
+    """assertUsesIndex checks the plan PostgreSQL picks with sequential scans disabled, so the result does not depend on table sizes"""
+
+    def index_names(self, model, column):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        return {name for name, constraint in constraints.items() if (constraint['index'] or constraint['unique']) and constraint['columns'] == [column]}
+
+    def assertUsesIndex(self, queryset, index_names):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertTrue(index_names, 'no index to look for')
+        self.assertTrue(any(name in plan for name in index_names), f'none of {sorted(index_names)} in\n{plan}')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'query plans of PostgreSQL')
+class QueryPlanTests(QueryPlanMixin, TestCase):
+
+    def test_cleanup_filters_use_timestamp_indexes(self):
+        cutoff = timezone.now() - timedelta(minutes=5)
+        for model, field in ((Email_OTP, 'created_time'), (Two_Factor_OTP, 'created_time'), (SignUpUser, 'token_generated_at')):
+            with self.subTest(model=model.__name__):
+                self.assertUsesIndex(model.objects.filter(**{f'{field}__lt': cutoff}), self.index_names(model, field))
+
+    def test_phone_number_lookup_uses_unique_index(self):
+        self.assertUsesIndex(Two_Factor_Verification.objects.filter(phone_number=9876543210),
+                             self.index_names(Two_Factor_Verification, 'phone_number'))
@@ -9,18 +9,23 @@ class CoinAdmin(ModelAdmin):
     list_display = ['Name', 'FullName', 'Price', 'ChangePct']
 
 
-class MyHoldingsAdmin(ModelAdmin, DynamicArrayMixin):
-    formfield_overrides = {
-        ArrayField: {'widget': DynamicArrayTextareaWidget(attrs={'rows':1, 'cols':70})},
-    }
-    list_display = ['user']
+class HoldingAdmin(ModelAdmin):
+    list_display = ['user', 'coin', 'quantity']
+    list_select_related = ['user', 'coin']
+    raw_id_fields = ['user']
 
 
-class TransactionHistoryAdmin(ModelAdmin, DynamicArrayMixin):
-    formfield_overrides = {
-        ArrayField: {'widget': DynamicArrayTextareaWidget(attrs={'rows':1, 'cols':90})},
-    }
-    list_display = ['user']
+class TransactionAdmin(ModelAdmin):
+    list_display = ['user', 'side', 'coin', 'quantity', 'price', 'timestamp']
+    list_filter = ['side']
+    list_select_related = ['user', 'coin']
+    raw_id_fields = ['user']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 class MyWatchlistAdmin(ModelAdmin, DynamicArrayMixin):
@@ -35,7 +40,7 @@ class NewsAdmin(ModelAdmin):
 
 
 admin.site.register(Coin, CoinAdmin)
-admin.site.register(MyHoldings, MyHoldingsAdmin)
-admin.site.register(TransactionHistory, TransactionHistoryAdmin)
+admin.site.register(Holding, HoldingAdmin)
+admin.site.register(Transaction, TransactionAdmin)
 admin.site.register(MyWatchlist, MyWatchlistAdmin)
 admin.site.register(News, NewsAdmin)
\ No newline at end of file
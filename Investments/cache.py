@@ -0,0 +1,131 @@
+import json
+import time
+from decimal import Decimal
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from .models import Coin
+from .prices import get_redis
+
+
+def get_version(key):
+    """Version stamp stored at key, None when redis is unreachable"""
+    try:
+        return int(get_redis().get(key) or 0)
+    except redis.RedisError:
+        return None
+
+
+def bump_version(key):
+    """Sets a new version stamp at key, time based so versions are not reused after redis is flushed"""
+    version = time.time_ns()
+    try:
+        get_redis().set(key, version)
+    except redis.RedisError:
+        return None
+    return version
+
+
+# fields of the cached coins, Description is only read by CoinDetailsView
+COIN_FIELDS = ('id', 'Name', 'FullName', 'Price', 'ChangePct', 'Image')
+
+
+def load_coins(version):
+    """
+    {Name : Coin} of the catalog at version, shared between processes through redis as JSON
+    so only the first process to see a version reads the Coin table. The coins are unsaved
+    instances holding COIN_FIELDS, never save() them.
+    """
+    key = settings.COINS_CACHE_KEY + str(version)
+    try:
+        blob = get_redis().get(key) if version is not None else None
+    except redis.RedisError:
+        blob = None
+    if blob is not None:
+        values = json.loads(blob)
+        for value in values:
+            if value['Price'] is not None:
+                value['Price'] = Decimal(value['Price'])
+    else:
+        values = list(Coin.objects.values(*COIN_FIELDS))
+        if version is not None:
+            try:
+                get_redis().set(key, json.dumps(values, default=str), ex=settings.COINS_CACHE_TTL)
+            except redis.RedisError:
+                pass
+    return {value['Name']: Coin(**value) for value in values}
+
+
+class Versioned:
+    """
+    Process local value of load(version), the version stamp at key is checked at most every COINS_CACHE_CHECK seconds
+    and the value is reloaded when it changed
+    """
+
+    def __init__(self, key, load):
+        self.key = key
+        self.load = load
+        self.value = None
+        self.version = None
+        self.checked = 0
+
+    def get(self):
+        now = time.monotonic()
+        if self.value is not None and now - self.checked < settings.COINS_CACHE_CHECK:
+            return self.value
+        self.checked = now
+        version = get_version(self.key)
+        if self.value is None or version is None or version != self.version:
+            self.value = self.load(version)
+            self.version = version
+        return self.value
+
+
+_coins = Versioned(settings.COINS_VERSION_KEY, load_coins)
+
+
+def get_coins():
+    """Process local {Name : Coin}, reloaded when update_coins or add_coins_to_db bumped COINS_VERSION_KEY"""
+    return _coins.get()
+
+
+def get_coin(name):
+    return get_coins().get(name)
+
+
+class CachedGetMixin:
+    """
+    GET responses shared by all users, cached in redis per version of version_key and query string.
+    The version is sent as the ETag so clients already holding it get a 304 without a body,
+    once validate() accepted the request
+    """
+    version_key = None
+
+    def validate(self, request):
+        """Raises the error the view would return for this request, checked before answering 304"""
+
+    def get(self, request, *args, **kwargs):
+        version = get_version(self.version_key)
+        if version is None:
+            return super().get(request, *args, **kwargs)
+        self.validate(request)
+        etag = f'"{version}"'
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if_none_match = [tag.removeprefix('W/') for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))]
+        if etag in if_none_match or '*' in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        key = f'{type(self).__name__}:{version}:{request.GET.urlencode()}'
+        try:
+            data = cache.get(key)
+        except redis.RedisError:
+            data = None
+        if data is None:
+            data = super().get(request, *args, **kwargs).data
+            try:
+                cache.set(key, data, settings.RESPONSE_CACHE_TTL)
+            except redis.RedisError:
+                pass
+        return Response(data, headers=headers)
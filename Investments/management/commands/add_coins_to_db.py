@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 import cryptocompare
+from django.conf import settings
 from Investments.models import Coin
+from Investments.cache import bump_version
 
 
 class Command(BaseCommand):
@@ -41,6 +43,8 @@ class Command(BaseCommand):
                 unique_fields=['Name'],
                 update_fields=['Image', 'Description'],
             )
+            bump_version(settings.COINS_VERSION_KEY)
+            bump_version(settings.CATALOG_VERSION_KEY)
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(
@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def holdings_to_rows(apps, schema_editor):
+    MyHoldings = apps.get_model('Investments', 'MyHoldings')
+    Holding = apps.get_model('Investments', 'Holding')
+    Coin = apps.get_model('Investments', 'Coin')
+    coins = dict(Coin.objects.values_list('Name', 'id'))
+    rows = []
+    invalid = []
+    for obj in MyHoldings.objects.all().iterator():
+        quantities = {}
+        for holding in obj.MyHoldings:
+            try:
+                name, quantity = holding
+                quantity = float(quantity)
+            except (TypeError, ValueError):
+                invalid.append((obj.user_id, holding))
+                continue
+            if name not in coins:
+                invalid.append((obj.user_id, holding))
+                continue
+            quantities[name] = round(quantities.get(name, 0) + quantity, 8)
+        rows += [Holding(user_id=obj.user_id, coin_id=coins[name], quantity=quantity)
+                 for name, quantity in quantities.items() if quantity]
+    if invalid:
+        # MyHoldings is dropped next, stop before losing positions that have no row to go to
+        raise RuntimeError(f'{len(invalid)} holdings are unreadable or of coins missing from Coin, add the coins or fix these '
+                           f'(user id, holding) and migrate again : {invalid[:50]}')
+    Holding.objects.bulk_create(rows, batch_size=1000)
+
+
+def rows_to_holdings(apps, schema_editor):
+    MyHoldings = apps.get_model('Investments', 'MyHoldings')
+    Holding = apps.get_model('Investments', 'Holding')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    holdings = {}
+    for user_id, name, quantity in Holding.objects.order_by('id').values_list('user_id', 'coin__Name', 'quantity').iterator():
+        holdings.setdefault(user_id, []).append([name, str(quantity)])
+    users = User.objects.filter(pan_details__isnull=False).values_list('id', flat=True)
+    MyHoldings.objects.bulk_create([MyHoldings(user_id=id, MyHoldings=holdings.get(id, [])) for id in users], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('Investments', '0002_alter_mywatchlist_watchlist'),
+        ('Profile', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Holding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.FloatField()),
+                ('coin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to='Investments.coin')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['coin__Name'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='holding',
+            constraint=models.UniqueConstraint(fields=('user', 'coin'), name='unique_user_coin_holding'),
+        ),
+        migrations.RunPython(holdings_to_rows, rows_to_holdings),
+        migrations.DeleteModel(
+            name='MyHoldings',
+        ),
+    ]
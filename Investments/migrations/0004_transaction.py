@@ -0,0 +1,90 @@
+from datetime import datetime
+import re
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# Bought_{quantity}_{coin}_on_{%B %d; %Y}_at_price_{price}
+TRANSACTION = re.compile(r'^(Bought|Sold)_(.+?)_(\w+?)_on_(\w+ \d+; \d+)_at_price_(.+)$')
+
+
+def history_to_ledger(apps, schema_editor):
+    TransactionHistory = apps.get_model('Investments', 'TransactionHistory')
+    Transaction = apps.get_model('Investments', 'Transaction')
+    Coin = apps.get_model('Investments', 'Coin')
+    coins = dict(Coin.objects.values_list('Name', 'id'))
+    rows = []
+    invalid = []
+    for obj in TransactionHistory.objects.exclude(transactions=None).iterator():
+        for transaction in obj.transactions:
+            match = TRANSACTION.match(transaction)
+            if match is None or match[3] not in coins:
+                invalid.append((obj.user_id, transaction))
+                continue
+            side, quantity, name, day, price = match.groups()
+            try:
+                quantity, price = float(quantity), float(price)
+                timestamp = django.utils.timezone.make_aware(datetime.strptime(day, '%B %d; %Y'))
+            except ValueError:
+                invalid.append((obj.user_id, transaction))
+                continue
+            rows.append(Transaction(user_id=obj.user_id, coin_id=coins[name], side='BUY' if side == 'Bought' else 'SELL',
+                                    quantity=quantity, price=price, amount=round(quantity * price, 8), timestamp=timestamp))
+    if invalid:
+        # TransactionHistory is dropped next, stop before losing entries that have no row to go to
+        raise RuntimeError(f'{len(invalid)} transactions are unreadable or of coins missing from Coin, add the coins or fix these '
+                           f'(user id, transaction) and migrate again : {invalid[:50]}')
+    Transaction.objects.bulk_create(rows, batch_size=1000)
+
+
+def ledger_to_history(apps, schema_editor):
+    TransactionHistory = apps.get_model('Investments', 'TransactionHistory')
+    Transaction = apps.get_model('Investments', 'Transaction')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    history = {}
+    ledger = Transaction.objects.order_by('timestamp', 'id').values_list('user_id', 'side', 'quantity', 'coin__Name', 'timestamp', 'price')
+    for user_id, side, quantity, name, timestamp, price in ledger.iterator():
+        day = django.utils.timezone.localtime(timestamp).strftime('%B %d; %Y')
+        history.setdefault(user_id, []).append(
+            f'{"Bought" if side == "BUY" else "Sold"}_{quantity}_{name}_on_{day}_at_price_{price}')
+    users = User.objects.filter(pan_details__isnull=False).values_list('id', flat=True)
+    TransactionHistory.objects.bulk_create([TransactionHistory(user_id=id, transactions=history.get(id, [])) for id in users], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('Investments', '0003_holding'),
+        ('Profile', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('side', models.CharField(choices=[('BUY', 'Bought'), ('SELL', 'Sold')], max_length=4)),
+                ('quantity', models.FloatField()),
+                ('price', models.FloatField()),
+                ('amount', models.FloatField()),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('coin', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transactions', to='Investments.coin')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-timestamp'], name='transaction_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'coin'], name='transaction_user_coin_idx'),
+        ),
+        migrations.RunPython(history_to_ledger, ledger_to_history),
+        migrations.DeleteModel(
+            name='TransactionHistory',
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.1.4 on 2026-10-17 22:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Investments', '0004_transaction'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='coin',
+            name='Price',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=24, null=True),
+        ),
+        migrations.AlterField(
+            model_name='holding',
+            name='quantity',
+            field=models.DecimalField(decimal_places=8, max_digits=24),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=models.DecimalField(decimal_places=8, max_digits=24),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='price',
+            field=models.DecimalField(decimal_places=8, max_digits=24),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='quantity',
+            field=models.DecimalField(decimal_places=8, max_digits=24),
+        ),
+    ]
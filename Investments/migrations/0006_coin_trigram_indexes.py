@@ -0,0 +1,24 @@
+# Generated by Django 4.1.4 on 2026-10-17 22:07
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Investments', '0005_decimal_money'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='coin',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['Name'], name='coin_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='coin',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['FullName'], name='coin_fullname_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.db.models.base import Model
-from django.db.models.fields import FloatField, CharField, URLField, TextField
-from django.db.models.fields.related import OneToOneField
-from django.db.models import CASCADE
+from django.db.models.fields import FloatField, DecimalField, CharField, URLField, TextField, DateTimeField
+from django.db.models.fields.related import OneToOneField, ForeignKey
+from django.db.models import CASCADE, PROTECT, UniqueConstraint, Index
+from django.utils import timezone
+from django.contrib.postgres.indexes import GinIndex
 from django_better_admin_arrayfield.models.fields import ArrayField
 from Authentication.models import User
 
@@ -9,7 +11,7 @@ from Authentication.models import User
 class Coin(Model):
     Name = CharField(max_length=10, unique=True)
     FullName = CharField(max_length=100, unique=True)
-    Price = FloatField(null=True, blank=True)
+    Price = DecimalField(max_digits=24, decimal_places=8, null=True, blank=True)
     ChangePct = FloatField(null=True, blank=True)
     Image = URLField()
     Description = TextField()
@@ -19,16 +21,41 @@ class Coin(Model):
 
     class Meta:
         ordering = ['Name']
+        indexes = [GinIndex(fields=['Name'], name='coin_name_trgm_idx', opclasses=['gin_trgm_ops']),
+                   GinIndex(fields=['FullName'], name='coin_fullname_trgm_idx', opclasses=['gin_trgm_ops'])]
 
 
-class MyHoldings(Model):
-    user = OneToOneField(User, on_delete=CASCADE, related_name='my_holdings')
-    MyHoldings = ArrayField(ArrayField(CharField(max_length=20, blank=True), size = 2), blank=True)
+class Holding(Model):
+    user = ForeignKey(User, on_delete=CASCADE, related_name='holdings')
+    coin = ForeignKey(Coin, on_delete=CASCADE, related_name='holdings')
+    quantity = DecimalField(max_digits=24, decimal_places=8)
 
+    def __str__(self):
+        return '%s : %s %s' % (self.user, self.quantity, self.coin.Name)
+
+    class Meta:
+        ordering = ['coin__Name']
+        constraints = [UniqueConstraint(fields=['user', 'coin'], name='unique_user_coin_holding')]
+
+
+class Transaction(Model):
+    BUY = 'BUY'
+    SELL = 'SELL'
 
-class TransactionHistory(Model):
-    user = OneToOneField(User, on_delete=CASCADE, related_name='transactions')
-    transactions = ArrayField(CharField(max_length=255, blank=True), null = True, blank = True)
+    user = ForeignKey(User, on_delete=CASCADE, related_name='transactions')
+    coin = ForeignKey(Coin, on_delete=PROTECT, related_name='transactions')
+    side = CharField(max_length=4, choices=[(BUY, 'Bought'), (SELL, 'Sold')])
+    quantity = DecimalField(max_digits=24, decimal_places=8)
+    price = DecimalField(max_digits=24, decimal_places=8)
+    amount = DecimalField(max_digits=24, decimal_places=8)
+    timestamp = DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return '%s %s %s %s at %s' % (self.user, self.get_side_display(), self.quantity, self.coin.Name, self.price)
+
+    class Meta:
+        indexes = [Index(fields=['user', '-timestamp'], name='transaction_user_time_idx'),
+                   Index(fields=['user', 'coin'], name='transaction_user_coin_idx')]
 
 
 class MyWatchlist(Model):
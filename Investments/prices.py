@@ -0,0 +1,153 @@
+import os
+import time
+import logging
+import json
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import redis
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from .models import Coin
+from .utils import to_decimal
+
+
+# cryptocompare rejects fsyms longer than 300 characters
+FSYMS_MAX_LENGTH = 300
+
+_session = None
+_redis = None
+
+
+def get_session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.COINS_FETCH_WORKERS)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+
+def make_batches(symbols, batch_size):
+    batches = [[]]
+    length = 0
+    for symbol in symbols:
+        if len(batches[-1]) == batch_size or length + len(symbol) + 1 > FSYMS_MAX_LENGTH:
+            batches.append([])
+            length = 0
+        batches[-1].append(symbol)
+        length += len(symbol) + 1
+    return [batch for batch in batches if batch]
+
+
+def fetch_price_batch(symbols, currency='INR'):
+    params = {'fsyms': ','.join(symbols), 'tsyms': currency}
+    api_key = os.environ.get('CRYPTOCOMPARE_API_KEY')
+    if api_key:
+        params['api_key'] = api_key
+    response = get_session().get(settings.CRYPTOCOMPARE_API_URL + 'pricemultifull', params=params, timeout=10)
+    response.raise_for_status()
+    return response.json().get('RAW', {})
+
+
+def fetch_prices(symbols, currency='INR', batch_size=None, workers=None, fetch=fetch_price_batch):
+    """
+    Fetches prices for all symbols with one pricemultifull request per batch,
+    running the batches on a bounded thread pool.
+    Returns {symbol : {'PRICE' : .., 'CHANGEPCTHOUR' : ..}}, failed batches are logged and left out.
+    """
+    batches = make_batches(list(symbols), batch_size or settings.COINS_BATCH_SIZE)
+
+    def run(batch):
+        try:
+            return fetch(batch, currency)
+        except (requests.RequestException, ValueError) as e:
+            logging.warning('price batch %s..%s failed : %s', batch[0], batch[-1], e)
+            return {}
+
+    data = {}
+    with ThreadPoolExecutor(max_workers=workers or settings.COINS_FETCH_WORKERS) as executor:
+        for raw in executor.map(run, batches):
+            for symbol, quotes in raw.items():
+                if currency in quotes:
+                    data[symbol] = quotes[currency]
+    return data
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+def commit_prices(coins, data):
+    """
+    Writes Price and ChangePct of the coins whose values changed in one bulk_update,
+    coins missing from data, or without a usable price, are left unchanged.
+    Returns the diff of changed coins and the time taken by the write.
+    """
+    changed = []
+    diff = []
+    for coin in coins:
+        try:
+            price = to_decimal(data[coin.Name]['PRICE'])
+            changepct = round(data[coin.Name]['CHANGEPCTHOUR'], 8)
+        except (KeyError, TypeError, ArithmeticError):
+            continue
+        if coin.Price == price and coin.ChangePct == changepct:
+            continue
+        diff.append({'Name': coin.Name, 'OldPrice': coin.Price, 'Price': price,
+                     'OldChangePct': coin.ChangePct, 'ChangePct': changepct})
+        coin.Price = price
+        coin.ChangePct = changepct
+        changed.append(coin)
+    start = time.perf_counter()
+    if changed:
+        Coin.objects.bulk_update(changed, ['Price', 'ChangePct'])
+    return diff, time.perf_counter() - start
+
+
+def cache_prices(coins):
+    """Writes {Name : 'id:Price'} of the priced coins to COINS_PRICES_KEY, read by quotes without touching the Coin table"""
+    prices = {coin.Name: f'{coin.id}:{coin.Price}' for coin in coins if coin.Price}
+    if not prices:
+        return
+    try:
+        pipe = get_redis().pipeline()
+        pipe.delete(settings.COINS_PRICES_KEY)
+        pipe.hset(settings.COINS_PRICES_KEY, mapping=prices)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def cached_price(name):
+    """(id, Price) of the coin from the price cache, or from the Coin table when it is not cached"""
+    try:
+        value = get_redis().hget(settings.COINS_PRICES_KEY, name)
+    except redis.RedisError:
+        value = None
+    if value is None:
+        return Coin.objects.filter(Name=name).values_list('id', 'Price').first()
+    id, price = value.decode().split(':')
+    return int(id), Decimal(price)
+
+
+def publish_prices(diff):
+    """Publishes the diff of a cycle on COINS_CHANNEL, returns the number of receivers"""
+    if not diff:
+        return 0
+    try:
+        return get_redis().publish(settings.COINS_CHANNEL, json.dumps({'time': time.time(), 'coins': diff}, default=float))
+    except redis.RedisError:
+        return 0
+
+
+def publish_trade(user, *coinnames):
+    """Publishes on TRADES_CHANNEL that the user's wallet and holdings in coinnames changed"""
+    try:
+        return get_redis().publish(settings.TRADES_CHANNEL, json.dumps({'user': user.id, 'coins': list(coinnames)}))
+    except redis.RedisError:
+        return 0
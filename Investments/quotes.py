@@ -0,0 +1,59 @@
+import json
+import time
+import uuid
+from decimal import Decimal
+import redis
+from django.conf import settings
+from rest_framework import status
+from Authentication.utils import CustomError
+from .models import Coin
+from .prices import get_redis, cached_price
+from .cache import get_coin
+
+
+def create_quote(user, coinname):
+    """Stores the current price of the coin for QUOTE_TTL seconds under a single use quote id"""
+    coin = cached_price(coinname)
+    if coin is None or not coin[1]:
+        raise CustomError("Coin not available to trade", code=status.HTTP_404_NOT_FOUND)
+    quote = {'quote_id': uuid.uuid4().hex, 'coin_name': coinname, 'price': coin[1], 'expires': time.time() + settings.QUOTE_TTL}
+    try:
+        get_redis().set(settings.QUOTE_KEY + quote['quote_id'], json.dumps({**quote, 'user': user.id, 'coin': coin[0]}, default=str),
+                        ex=settings.QUOTE_TTL)
+    except redis.RedisError:
+        raise CustomError("Quotes are unavailable, try again", code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return quote
+
+
+def redeem_quote(user, quote_id, coinname):
+    """
+    Uses up the quote and returns the coin priced at the quote,
+    rejects it when the cached price moved more than QUOTE_TOLERANCE away from the quoted one
+    """
+    try:
+        pipe = get_redis().pipeline()
+        pipe.get(settings.QUOTE_KEY + quote_id)
+        pipe.delete(settings.QUOTE_KEY + quote_id)
+        value = pipe.execute()[0]
+    except redis.RedisError:
+        raise CustomError("Quotes are unavailable, try again", code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    if value is None:
+        raise CustomError("Quote expired, request a new one", code=status.HTTP_410_GONE)
+    quote = json.loads(value)
+    if quote['user'] != user.id or quote['coin_name'] != coinname:
+        raise CustomError("Invalid quote")
+    price = Decimal(quote['price'])
+    coin = cached_price(coinname)
+    if coin is None or not coin[1] or abs(coin[1] - price) > price * Decimal(settings.QUOTE_TOLERANCE):
+        raise CustomError("Price moved, request a new quote", code=status.HTTP_409_CONFLICT)
+    return Coin(id=quote['coin'], Name=coinname, Price=price)
+
+
+def trade_coin(user, data):
+    """Coin of the order, priced at its quote when the order has a quote_id"""
+    if data.get('quote_id'):
+        return redeem_quote(user, data['quote_id'], data['coin_name'])
+    coin = get_coin(data['coin_name'])
+    if coin is None:
+        raise CustomError("Coin not available to trade", code=status.HTTP_404_NOT_FOUND)
+    return coin
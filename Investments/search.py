@@ -0,0 +1,80 @@
+import re
+from bisect import bisect_left
+from django.conf import settings
+from .models import Coin
+from .cache import Versioned
+
+
+# words as pg_trgm splits them, runs of letters and digits
+WORD = re.compile(r'[^\W_]+')
+
+
+def trigrams(text):
+    """Trigrams of text the way pg_trgm extracts them, each lowercased word padded with two spaces before and one after"""
+    grams = set()
+    for word in WORD.findall(text.lower()):
+        word = f'  {word} '
+        grams.update(word[i:i+3] for i in range(len(word) - 2))
+    return grams
+
+
+class SearchIndex:
+    """
+    Trigram and prefix index over the Name and FullName of the coins.
+    Similarity is pg_trgm's, shared trigrams over the trigrams of both strings.
+    """
+
+    def __init__(self, coins):
+        self.coins = list(coins)
+        self.postings = {}
+        self.sizes = []
+        prefixes = []
+        for i, (name, fullname) in enumerate(self.coins):
+            for field, text in enumerate((name, fullname)):
+                grams = trigrams(text)
+                self.sizes.append(len(grams))
+                for gram in grams:
+                    self.postings.setdefault(gram, []).append(2 * i + field)
+            prefixes += [(word, i) for word in {name.lower(), fullname.lower(), *WORD.findall(fullname.lower())}]
+        prefixes.sort()
+        self.prefix_keys = [key for key, i in prefixes]
+        self.prefix_coins = [i for key, i in prefixes]
+
+    def similarities(self, query):
+        """{coin : greatest similarity of Name and FullName} for the coins sharing a trigram with query"""
+        grams = trigrams(query)
+        common = {}
+        for gram in grams:
+            for field in self.postings.get(gram, ()):
+                common[field] = common.get(field, 0) + 1
+        scores = {}
+        for field, count in common.items():
+            similarity = count / (len(grams) + self.sizes[field] - count)
+            if similarity > scores.get(field // 2, 0):
+                scores[field // 2] = similarity
+        return scores
+
+    def prefixed(self, query):
+        """Coins whose Name, FullName or a word of FullName starts with query"""
+        query = query.lower()
+        start = bisect_left(self.prefix_keys, query)
+        end = bisect_left(self.prefix_keys, query + '\uffff', start)
+        return set(self.prefix_coins[start:end])
+
+    def search(self, query, threshold=0.3):
+        """[(Name, FullName)] with similarity above threshold or matching the query as a prefix, most similar first"""
+        query = query.strip()
+        if not query:
+            return []
+        scores = self.similarities(query)
+        matches = {i for i, similarity in scores.items() if similarity >= threshold} | self.prefixed(query)
+        ranked = sorted(matches, key=lambda i: (-scores.get(i, 0), self.coins[i][0]))
+        return [self.coins[i] for i in ranked]
+
+
+_index = Versioned(settings.CATALOG_VERSION_KEY, lambda version: SearchIndex(Coin.objects.values_list('Name', 'FullName')))
+
+
+def get_search_index():
+    """Process local SearchIndex, built on first use and rebuilt when add_coins_to_db bumped CATALOG_VERSION_KEY"""
+    return _index.get()
@@ -1,16 +1,25 @@
 from .models import *
-from rest_framework.serializers import Serializer, ModelSerializer, CharField, FloatField, BooleanField
+from rest_framework.serializers import Serializer, ModelSerializer, CharField, DecimalField, BooleanField, SlugRelatedField, ListField
 from .utils import *
+from .prices import publish_trade
+from .trades import buy, sell, execute_orders
+from .quotes import create_quote, trade_coin
+from .cache import get_coins, get_coin
 from rest_framework import status
 from django.core.exceptions import ObjectDoesNotExist
-from datetime import date
 
-datee = lambda : date.today().strftime("%B %d; %Y")
+
+class AmountField(DecimalField):
+    """Decimal input of any precision, rounded to 8 places by the trade engine instead of being rejected"""
+
+    def __init__(self, **kwargs):
+        super().__init__(max_digits = None, decimal_places = None, min_value = 0, max_value = 10 ** 12, **kwargs)
 
 
 class BuyCoinSerializer(Serializer):
     coin_name = CharField(write_only = True)
-    buy_amount = FloatField(write_only = True)
+    buy_amount = AmountField(write_only = True)
+    quote_id = CharField(write_only = True, required = False)
 
     def validate(self, data):
         user = self.context['request'].user
@@ -20,46 +29,25 @@ class BuyCoinSerializer(Serializer):
         except ObjectDoesNotExist:
             raise CustomError("Verify yourself with PAN to trade", code=status.HTTP_406_NOT_ACCEPTABLE)
 
-        coin = Coin.objects.filter(Name = data['coin_name'])
-        if not coin.exists():
-            raise CustomError("Coin not available to trade", code=status.HTTP_404_NOT_FOUND)
-
-        wallet = user.wallet
-        if wallet.amount < data['buy_amount']:
-            raise CustomError("Insufficient wallet balance", code=status.HTTP_403_FORBIDDEN)
-
         if data['buy_amount'] < 1:
             raise CustomError("Invalid amount, you need to spend atleast INR 1")
 
-        data['coin'] = coin[0]
+        data['coin'] = trade_coin(user, data)
         data['user'] = user
-        data['wallet'] = wallet
         return data
 
     def create(self, validated_data):
-        price = validated_data['coin'].Price
         coinname = validated_data['coin_name']
-        amount = round(validated_data['buy_amount'], 8)
+        number_of_coins = buy(validated_data['user'], validated_data['coin'], validated_data['buy_amount'])
+        publish_trade(validated_data['user'], coinname)
 
-        validated_data['wallet'].amount -= amount
-        validated_data['wallet'].save()
-
-        number_of_coins = round( amount / price , 8)
-
-        obj = validated_data['user'].transactions
-        obj.transactions.append(
-            f'Bought_{number_of_coins}_{coinname}_on_{datee()}_at_price_{price}')
-        obj.save()
-
-        obj = validated_data['user'].my_holdings
-        update_my_holdings(obj, coinname, number_of_coins)
-
-        return {'message' : [f'{number_of_coins} {coinname} added to your holdings']}
+        return {'message' : [f'{number_of_coins:f} {coinname} added to your holdings'], 'price' : validated_data['coin'].Price}
 
 
 class SellCoinSerializer(Serializer):
     coin_name = CharField(write_only = True)
-    sell_quantity = FloatField(write_only = True)
+    sell_quantity = AmountField(write_only = True)
+    quote_id = CharField(write_only = True, required = False)
 
     def validate(self, data):
         user = self.context['request'].user
@@ -69,58 +57,75 @@ class SellCoinSerializer(Serializer):
         except ObjectDoesNotExist:
             raise CustomError("Verify yourself with PAN to trade", code=status.HTTP_406_NOT_ACCEPTABLE)
 
-        coin = Coin.objects.filter(Name = data['coin_name'])
-        if not coin.exists():
-            raise CustomError("Coin not available to trade", code=status.HTTP_404_NOT_FOUND)
-
-        holdings = user.my_holdings
-        for holding in holdings.MyHoldings:
-            if holding[0] == data['coin_name']:
-                quantity = holding[1]
-                break
-        else:
-            raise CustomError("Buy this coin first", code=status.HTTP_403_FORBIDDEN)
-
-        if float(quantity) < data['sell_quantity']:
-            raise CustomError("Not enough coins", code=status.HTTP_403_FORBIDDEN)
-
-        data['coin'] = coin[0]
+        data['coin'] = trade_coin(user, data)
         data['user'] = user
-        data['holdings'] = holdings
         return data
 
     def update(self, validated_data):
-        number_of_coins = round(validated_data['sell_quantity'], 8)
-        price = validated_data['coin'].Price
-        sell_amount = round(number_of_coins * price, 8)
         coinname = validated_data['coin_name']
+        sell_amount = sell(validated_data['user'], validated_data['coin'], validated_data['sell_quantity'])
+        publish_trade(validated_data['user'], coinname)
 
-        obj = validated_data['user'].wallet
-        obj.amount += sell_amount
-        obj.save()
+        return {'message' : [f'INR {sell_amount:f} added to your wallet'], 'price' : validated_data['coin'].Price}
 
-        obj = validated_data['user'].transactions
-        obj.transactions.append(
-            f'Sold_{number_of_coins}_{coinname}_on_{datee()}_at_price_{price}')
-        obj.save()
 
-        obj = validated_data['holdings']
-        update_my_holdings(obj, coinname, -number_of_coins)
+class QuoteSerializer(Serializer):
+    coin_name = CharField(write_only = True)
 
-        return {'message' : [f'INR {sell_amount} added to your wallet']}
+    def create(self, validated_data):
+        return create_quote(self.context['request'].user, validated_data['coin_name'])
 
 
-class MyHoldingsSerializer(ModelSerializer):
-    class Meta:
-        model = MyHoldings
-        fields = ['MyHoldings']
+class OrderSerializer(Serializer):
+    coin_name = CharField()
+    buy_amount = AmountField(required = False)
+    sell_quantity = AmountField(required = False)
+
+    def validate(self, data):
+        if ('buy_amount' in data) == ('sell_quantity' in data):
+            raise CustomError('Specify either buy_amount or sell_quantity for every order')
+        return data
+
+
+class BatchOrderSerializer(Serializer):
+    orders = ListField(child = OrderSerializer(), allow_empty = False, max_length = 50, write_only = True)
+
+    def validate(self, data):
+        user = self.context['request'].user
 
+        try: 
+            user.pan_details
+        except ObjectDoesNotExist:
+            raise CustomError("Verify yourself with PAN to trade", code=status.HTTP_406_NOT_ACCEPTABLE)
+
+        data['coins'] = get_coins()
+        data['user'] = user
+        return data
+
+    def create(self, validated_data):
+        coins = validated_data['coins']
+        results = {}
+        orders = []
+        for i, order in enumerate(validated_data['orders']):
+            if order['coin_name'] not in coins:
+                results[i] = {'coin_name': order['coin_name'], 'status': 'rejected', 'message': 'Coin not available to trade'}
+            elif order.get('buy_amount', 1) < 1:
+                results[i] = {'coin_name': order['coin_name'], 'status': 'rejected', 'message': 'Invalid amount, you need to spend atleast INR 1'}
+            else:
+                orders.append((i, (coins[order['coin_name']], order.get('buy_amount'), order.get('sell_quantity'))))
+        if orders:
+            executed = execute_orders(validated_data['user'], [order for i, order in orders])
+            results.update(zip([i for i, order in orders], executed))
+            traded = {result['coin_name'] for result in executed if result['status'] == 'executed'}
+            if traded:
+                publish_trade(validated_data['user'], *traded)
+        return {'orders' : [results[i] for i in range(len(validated_data['orders']))]}
+
+
+class MyHoldingsSerializer(Serializer):
     def to_representation(self, instance):
-        response = []
-        for holding in instance.MyHoldings:
-            coin = Coin.objects.get(Name = holding[0])
-            response.append([coin.Name, coin.Image, holding[1]])
-        return {"MyHoldings" : response}
+        response = instance.holdings.values_list('coin__Name', 'coin__Image', 'quantity')
+        return {"MyHoldings" : [list(holding) for holding in response]}
 
 
 class MyWatchlistSerializer(ModelSerializer):
@@ -135,8 +140,7 @@ class MyWatchlistSerializer(ModelSerializer):
     def validate(self, data):
         if not data['add'] ^ data['remove']:
             raise CustomError('Specify whether to add or remove')
-        coin = Coin.objects.filter(Name = data['watchlist'][0])
-        if not coin.exists():
+        if get_coin(data['watchlist'][0]) is None:
             raise CustomError("Coin not available to trade", code=status.HTTP_404_NOT_FOUND)
         return data
         
@@ -169,6 +173,8 @@ class CoinSerializer(ModelSerializer):
 
 
 class TransactionsSerializer(ModelSerializer):
+    coin = SlugRelatedField(slug_field = 'Name', read_only = True)
+
     class Meta:
-        model = TransactionHistory
-        fields = ['transactions']
+        model = Transaction
+        fields = ['id', 'coin', 'side', 'quantity', 'price', 'amount', 'timestamp']
@@ -1,39 +1,20 @@
 from celery import shared_task
-import cryptocompare
-import time
-import queue
-from threading import Thread
 from .models import Coin, News
+from django.conf import settings
+from .prices import fetch_prices, commit_prices, cache_prices, publish_prices
+from .cache import bump_version
 from .web_scrapping import web_scrap_news, web_scrap_coins
 
 
 @shared_task(bind=True)
 def update_coins(self):
-    coins = Coin.objects.all()
-    threadlist = []
-    que = queue.Queue()
-    for coin in coins:
-        thread = Thread(target=lambda q, args: q.put({coin.Name: cryptocompare.get_price(
-            coin.Name, currency='INR', full=True)}), args=(que, coin.Name))
-        threadlist.append(thread)
-        threadlist[-1].start()
-        if len(threadlist) == 50:
-            time.sleep(1)
-    for thread in threadlist:
-        thread.join()
-    data = {}
-    while not que.empty():
-        result = que.get()
-        data.update(result)
-    for coin in coins:
-        try:
-            coindata = data[coin.Name]['RAW'][coin.Name]['INR']
-            coin.Price = round(coindata['PRICE'], 8)
-            coin.ChangePct = round(coindata['CHANGEPCTHOUR'], 8)
-        except TypeError:
-            coin.Price = 0
-            coin.ChangePct = 0
-        coin.save()
+    coins = Coin.objects.only('Name', 'Price', 'ChangePct')
+    data = fetch_prices(coin.Name for coin in coins)
+    diff, elapsed = commit_prices(coins, data)
+    cache_prices(coins)
+    if diff:
+        bump_version(settings.COINS_VERSION_KEY)
+    publish_prices(diff)
     # coinslist = web_scrap_coins()
     # for coin in coinslist:
     #     try:
@@ -47,7 +28,7 @@ def update_coins(self):
     #             Price = coin[1],
     #             ChangePct = coin[2]
     #         )
-    return 'COINS UPDATED'
+    return f'COINS UPDATED : {len(diff)} rows written in {elapsed:.3f}s'
 
 
 @shared_task(bind=True)
@@ -60,4 +41,5 @@ def update_news(self):
             news = news[1],
             image = news[2]
         )
+    bump_version(settings.NEWS_VERSION_KEY)
     return 'NEWS UPDATED'
\ No newline at end of file
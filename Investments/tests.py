@@ -1,3 +1,249 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from threading import Barrier, Thread
+from unittest import mock, skipUnless
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+import requests
+from Authentication.models import User
+from Authentication.tests import QueryPlanMixin
+from Authentication.utils import CustomError
+from Profile.models import Wallet
+from .cache import load_coins
+from .models import Coin, Holding, Transaction
+from .search import SearchIndex, trigrams
+from .prices import make_batches, fetch_prices, commit_prices, FSYMS_MAX_LENGTH
+from .trades import Book, buy, sell, execute_orders
 
-# Create your tests here.
+
+class MakeBatchesTests(SimpleTestCase):
+
+    def test_batch_size(self):
+        symbols = [f'C{i}' for i in range(10)]
+        batches = make_batches(symbols, 4)
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+        self.assertEqual(sum(batches, []), symbols)
+
+    def test_fsyms_length(self):
+        symbols = ['X' * 9 + str(i % 10) for i in range(100)]
+        batches = make_batches(symbols, 100)
+        self.assertGreater(len(batches), 1)
+        for batch in batches:
+            self.assertLessEqual(len(','.join(batch)), FSYMS_MAX_LENGTH)
+        self.assertEqual(sum(batches, []), symbols)
+
+    def test_empty(self):
+        self.assertEqual(make_batches([], 50), [])
+
+
+class FetchPricesTests(SimpleTestCase):
+
+    def stub(self, failing):
+        def fetch(batch, currency):
+            if any(symbol in failing for symbol in batch):
+                raise requests.ConnectionError('stub failure')
+            return {symbol: {currency: {'PRICE': i, 'CHANGEPCTHOUR': 0}} for i, symbol in enumerate(batch)}
+        return fetch
+
+    def test_merges_batches(self):
+        symbols = [f'C{i}' for i in range(25)]
+        data = fetch_prices(symbols, batch_size=10, workers=3, fetch=self.stub(set()))
+        self.assertEqual(set(data), set(symbols))
+        self.assertEqual(data['C12'], {'PRICE': 2, 'CHANGEPCTHOUR': 0})
+
+    def test_failed_batches_left_out(self):
+        symbols = [f'C{i}' for i in range(25)]
+        data = fetch_prices(symbols, batch_size=10, workers=3, fetch=self.stub({'C13'}))
+        self.assertEqual(set(data), set(symbols[:10] + symbols[20:]))
+
+    def test_other_currency_skipped(self):
+        data = fetch_prices(['BTC'], currency='USD', fetch=lambda batch, currency: {'BTC': {'INR': {'PRICE': 1}}})
+        self.assertEqual(data, {})
+
+
+class CommitPricesTests(SimpleTestCase):
+
+    def test_missing_coins_unchanged(self):
+        coins = [Coin(Name='BTC', Price=Decimal('1'), ChangePct=0.5), Coin(Name='ETH', Price=Decimal('2'), ChangePct=0.1),
+                 Coin(Name='DOGE', Price=Decimal('3'), ChangePct=0.2)]
+        data = {'BTC': {'PRICE': 1.5, 'CHANGEPCTHOUR': 0.5}, 'DOGE': {'PRICE': None, 'CHANGEPCTHOUR': 0.2}}
+        with mock.patch.object(Coin.objects, 'bulk_update') as bulk_update:
+            diff, elapsed = commit_prices(coins, data)
+        self.assertEqual([entry['Name'] for entry in diff], ['BTC'])
+        self.assertEqual(diff[0]['Price'], Decimal('1.5'))
+        self.assertEqual(bulk_update.call_args.args[0], coins[:1])
+        self.assertEqual((coins[1].Price, coins[2].Price), (Decimal('2'), Decimal('3')))
+
+    def test_nothing_changed(self):
+        coins = [Coin(Name='BTC', Price=Decimal('1.5'), ChangePct=0.5)]
+        with mock.patch.object(Coin.objects, 'bulk_update') as bulk_update:
+            diff, elapsed = commit_prices(coins, {'BTC': {'PRICE': 1.5, 'CHANGEPCTHOUR': 0.5}})
+        self.assertEqual(diff, [])
+        bulk_update.assert_not_called()
+
+
+class StubRedis(dict):
+
+    def get(self, key):
+        return super().get(key)
+
+    def set(self, key, value, ex=None):
+        self[key] = value
+
+
+class LoadCoinsTests(SimpleTestCase):
+
+    def test_shared_as_json(self):
+        values = [{'id': 1, 'Name': 'BTC', 'FullName': 'Bitcoin', 'Price': Decimal('1234.00000001'), 'ChangePct': 0.5, 'Image': 'btc.png'},
+                  {'id': 2, 'Name': 'NEW', 'FullName': 'New coin', 'Price': None, 'ChangePct': None, 'Image': 'new.png'}]
+        stub = StubRedis()
+        with mock.patch('Investments.cache.get_redis', return_value = stub), \
+             mock.patch.object(Coin.objects, 'values', return_value = values) as query:
+            loaded = load_coins(7)
+            shared = load_coins(7)
+        query.assert_called_once()
+        self.assertEqual(json.loads(next(iter(stub.values())))[0]['Price'], '1234.00000001')
+        for coins in (loaded, shared):
+            self.assertEqual(set(coins), {'BTC', 'NEW'})
+            self.assertEqual((coins['BTC'].id, coins['BTC'].Price, coins['BTC'].ChangePct), (1, Decimal('1234.00000001'), 0.5))
+            self.assertIsNone(coins['NEW'].Price)
+
+
+class SearchIndexTests(SimpleTestCase):
+    COINS = [('BTC', 'Bitcoin'), ('ETH', 'Ethereum'), ('USDT', 'Tether'), ('DOGE', 'Dogecoin'), ('SHIB', 'Shiba Inu'),
+             ('MATIC', 'Polygon'), ('BCH', 'Bitcoin Cash'), ('WBTC', 'Wrapped Bitcoin'), ('XRP', 'XRP'), ('SOL', 'Solana')]
+
+    def setUp(self):
+        self.index = SearchIndex(self.COINS)
+
+    def similarity(self, a, b):
+        a, b = trigrams(a), trigrams(b)
+        return len(a & b) / len(a | b) if a | b else 0
+
+    def test_pg_trgm_trigrams(self):
+        # examples of the pg_trgm documentation
+        self.assertEqual(trigrams('cat'), {'  c', ' ca', 'cat', 'at '})
+        self.assertAlmostEqual(self.similarity('word', 'two words'), 0.363636, places=6)
+        self.assertEqual(trigrams('Two-Words!'), trigrams('two words'))
+
+    def test_same_matches_as_full_scan(self):
+        for query in ('bit', 'bitcoin', 'etherium', 'doge', 'shib inu', 'sol', 'btc', 'polygn', 'cash', 'xyz', 'eth'):
+            scores = {coin: max(self.similarity(coin[0], query), self.similarity(coin[1], query)) for coin in self.COINS}
+            expected = sorted((coin for coin, score in scores.items() if score >= 0.3), key=lambda coin: (-scores[coin], coin[0]))
+            found = [coin for coin in self.index.search(query) if scores[coin] >= 0.3]
+            self.assertEqual(found, expected, query)
+
+    def test_threshold(self):
+        self.assertEqual(self.index.search('etherium'), [('ETH', 'Ethereum')])
+        self.assertAlmostEqual(self.similarity('eth', 'Ethereum'), 0.3)
+        self.assertIn(('ETH', 'Ethereum'), self.index.search('eth'))
+        self.assertEqual(self.index.search('xyz'), [])
+        self.assertEqual(self.index.search('  '), [])
+
+    def test_prefix(self):
+        self.assertLess(self.similarity('wrap', 'Wrapped Bitcoin'), 0.3)
+        self.assertEqual(self.index.search('wrap'), [('WBTC', 'Wrapped Bitcoin')])
+        self.assertEqual(self.index.search('INU'), [('SHIB', 'Shiba Inu')])
+
+    def test_ranking(self):
+        self.assertEqual(self.index.search('bitcoin'), [('BTC', 'Bitcoin'), ('BCH', 'Bitcoin Cash'), ('WBTC', 'Wrapped Bitcoin')])
+
+
+class BookTests(SimpleTestCase):
+
+    def book(self, amount, quantity = None):
+        book = Book.__new__(Book)
+        book.user = User(id = 1)
+        book.wallet = Wallet(user = book.user, amount = Decimal(amount))
+        self.coin = Coin(id = 1, Name = 'BTC', Price = Decimal('1e-8'))
+        book.holdings = {} if quantity is None else {1: Holding(id = 1, user = book.user, coin = self.coin, quantity = Decimal(quantity))}
+        book.transactions = []
+        return book
+
+    def test_balance_checked_first(self):
+        with self.assertRaisesMessage(CustomError, 'Insufficient wallet balance'):
+            self.book('10').buy(self.coin, 10 ** 12)
+
+    def test_quantity_too_large(self):
+        book = self.book('1000000000000')
+        with self.assertRaisesMessage(CustomError, 'Order too large to execute'):
+            book.buy(self.coin, 10 ** 12)
+        self.assertEqual((book.wallet.amount, book.holdings, book.transactions), (Decimal('1000000000000'), {}, []))
+
+    def test_wallet_overflow(self):
+        book = self.book('999999999999', '9999999999999999')
+        with self.assertRaisesMessage(CustomError, 'Order too large to execute'):
+            book.sell(self.coin, '9999999999999999')
+
+    def test_zero_quantity(self):
+        book = self.book('100000', '1')
+        for quantity in ('0', '0.000000004'):
+            with self.assertRaisesMessage(CustomError, 'Invalid quantity'):
+                book.sell(self.coin, quantity)
+        self.coin.Price = Decimal('1e12')
+        with self.assertRaisesMessage(CustomError, 'Amount too small'):
+            book.buy(self.coin, '1')
+        self.assertEqual((book.wallet.amount, book.holdings[1].quantity, book.transactions), (Decimal('100000'), Decimal('1'), []))
+
+    def test_buy(self):
+        book = self.book('10', '1')
+        self.assertEqual(book.buy(self.coin, '0.5'), Decimal('50000000'))
+        self.assertEqual((book.wallet.amount, book.holdings[1].quantity), (Decimal('9.5'), Decimal('50000001')))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs row locks of PostgreSQL')
+class ConcurrentTradesTests(TransactionTestCase):
+    THREADS = 8
+    ROUNDS = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user('trader@cryptbee.com', 'password')
+        Wallet.objects.create(user = self.user, amount = Decimal('1000'))
+        self.coins = [Coin.objects.create(Name = 'BTC', FullName = 'Bitcoin', Price = Decimal('3.14159265')),
+                      Coin.objects.create(Name = 'ETH', FullName = 'Ethereum', Price = Decimal('0.7'))]
+
+    def trade(self, barrier, index):
+        btc, eth = self.coins
+        try:
+            barrier.wait()
+            for round in range(self.ROUNDS):
+                try:
+                    if (index + round) % 3 == 0:
+                        buy(self.user, btc if index % 2 else eth, '7.5')
+                    elif (index + round) % 3 == 1:
+                        sell(self.user, btc if index % 2 else eth, '1.25')
+                    else:
+                        execute_orders(self.user, [(btc, '3', None), (eth, None, '2'), (eth, '4.5', None)])
+                except CustomError:
+                    pass
+        finally:
+            connection.close()
+
+    def test_ledger_matches_wallet_and_holdings(self):
+        barrier = Barrier(self.THREADS)
+        threads = [Thread(target = self.trade, args = (barrier, index)) for index in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ledger = Transaction.objects.filter(user = self.user)
+        self.assertTrue(ledger.exists())
+        spent = ledger.filter(side = Transaction.BUY).aggregate(total = Sum('amount'))['total'] or 0
+        earned = ledger.filter(side = Transaction.SELL).aggregate(total = Sum('amount'))['total'] or 0
+        self.assertEqual(Wallet.objects.get(user = self.user).amount, Decimal('1000') - spent + earned)
+        for coin in self.coins:
+            bought = ledger.filter(coin = coin, side = Transaction.BUY).aggregate(total = Sum('quantity'))['total'] or 0
+            sold = ledger.filter(coin = coin, side = Transaction.SELL).aggregate(total = Sum('quantity'))['total'] or 0
+            holding = Holding.objects.filter(user = self.user, coin = coin).first()
+            self.assertEqual(holding.quantity if holding else 0, bought - sold)
+            self.assertGreaterEqual(bought - sold, 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'query plans of PostgreSQL')
+class SearchQueryPlanTests(QueryPlanMixin, TestCase):
+
+    def test_trigram_filters_use_gin_indexes(self):
+        self.assertUsesIndex(Coin.objects.filter(Name__trigram_similar='btc'), {'coin_name_trgm_idx'})
+        self.assertUsesIndex(Coin.objects.filter(FullName__trigram_similar='bitcoin'), {'coin_fullname_trgm_idx'})
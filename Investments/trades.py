@@ -0,0 +1,132 @@
+from decimal import InvalidOperation
+from django.db import transaction
+from rest_framework import status
+from Authentication.utils import CustomError
+from Profile.models import Wallet
+from .models import Holding, Transaction
+from .utils import to_decimal, EIGHT
+
+
+# bounds of Holding.quantity and Wallet.amount, numeric(24, 8) and numeric(20, 8)
+MAX_QUANTITY = 10 ** 16
+MAX_AMOUNT = 10 ** 12
+
+
+def quantize(value, limit):
+    """value rounded to 8 places, a CustomError if it does not fit in a column bounded by limit"""
+    try:
+        value = value.quantize(EIGHT)
+    except InvalidOperation:
+        value = None
+    if value is None or value >= limit:
+        raise CustomError("Order too large to execute", code=status.HTTP_400_BAD_REQUEST)
+    return value
+
+
+def lock_wallet(user):
+    """
+    Locks the wallet row of the user until the end of the transaction.
+    Every trade takes this lock before reading the wallet or holdings, so trades of a user run one at a time
+    and always see the balance and quantities left by the previous one.
+    """
+    return Wallet.objects.select_for_update().get(user = user)
+
+
+class Book:
+    """
+    Wallet and holdings of a user in the given coins, loaded under the wallet lock.
+    Orders are applied in memory and written together by save(), call it inside the same transaction.
+    """
+
+    def __init__(self, user, coins):
+        self.user = user
+        self.wallet = lock_wallet(user)
+        self.holdings = {holding.coin_id: holding for holding in Holding.objects.filter(user = user, coin__in = coins)}
+        self.transactions = []
+
+    def buy(self, coin, amount):
+        """Spends amount from the wallet on coin at its current price, returns the number of coins bought"""
+        amount = to_decimal(amount)
+        price = coin.Price
+        if not price:
+            raise CustomError("Coin not available to trade", code=status.HTTP_404_NOT_FOUND)
+        if self.wallet.amount < amount:
+            raise CustomError("Insufficient wallet balance", code=status.HTTP_403_FORBIDDEN)
+        holding = self.holdings.get(coin.id) or Holding(user = self.user, coin = coin, quantity = 0)
+        number_of_coins = quantize(amount / price, MAX_QUANTITY - holding.quantity)
+        if number_of_coins <= 0:
+            raise CustomError("Amount too small to buy any coins")
+        self.wallet.amount -= amount
+        self.holdings[coin.id] = holding
+        holding.quantity += number_of_coins
+        self.transactions.append(Transaction(user = self.user, coin = coin, side = Transaction.BUY,
+                                             quantity = number_of_coins, price = price, amount = amount))
+        return number_of_coins
+
+    def sell(self, coin, quantity):
+        """Sells quantity of coin at its current price into the wallet, returns the amount credited"""
+        number_of_coins = to_decimal(quantity)
+        if number_of_coins <= 0:
+            raise CustomError("Invalid quantity, you need to sell more than 0 coins")
+        price = coin.Price
+        if not price:
+            raise CustomError("Coin not available to trade", code=status.HTTP_404_NOT_FOUND)
+        holding = self.holdings.get(coin.id)
+        if holding is None or holding.quantity == 0:
+            raise CustomError("Buy this coin first", code=status.HTTP_403_FORBIDDEN)
+        if holding.quantity < number_of_coins:
+            raise CustomError("Not enough coins", code=status.HTTP_403_FORBIDDEN)
+        sell_amount = quantize(number_of_coins * price, MAX_AMOUNT - self.wallet.amount)
+        self.wallet.amount += sell_amount
+        holding.quantity -= number_of_coins
+        self.transactions.append(Transaction(user = self.user, coin = coin, side = Transaction.SELL,
+                                             quantity = number_of_coins, price = price, amount = sell_amount))
+        return sell_amount
+
+    def save(self):
+        if not self.transactions:
+            return
+        self.wallet.save(update_fields = ['amount'])
+        holdings = self.holdings.values()
+        Holding.objects.filter(id__in = [holding.id for holding in holdings if holding.id and holding.quantity == 0]).delete()
+        Holding.objects.bulk_update([holding for holding in holdings if holding.id and holding.quantity], ['quantity'])
+        Holding.objects.bulk_create([holding for holding in holdings if holding.id is None and holding.quantity])
+        Transaction.objects.bulk_create(self.transactions)
+
+
+def buy(user, coin, amount):
+    with transaction.atomic():
+        book = Book(user, [coin])
+        number_of_coins = book.buy(coin, amount)
+        book.save()
+    return number_of_coins
+
+
+def sell(user, coin, quantity):
+    with transaction.atomic():
+        book = Book(user, [coin])
+        sell_amount = book.sell(coin, quantity)
+        book.save()
+    return sell_amount
+
+
+def execute_orders(user, orders):
+    """
+    Executes [(coin, buy_amount, sell_quantity)] in order under one lock and one write of the wallet, holdings and ledger.
+    A rejected order does not stop the others, returns a result per order.
+    """
+    results = []
+    with transaction.atomic():
+        book = Book(user, [coin for coin, buy_amount, sell_quantity in orders])
+        for coin, buy_amount, sell_quantity in orders:
+            try:
+                if buy_amount is not None:
+                    number_of_coins = book.buy(coin, buy_amount)
+                    results.append({'coin_name': coin.Name, 'status': 'executed', 'message': f'{number_of_coins:f} {coin.Name} added to your holdings'})
+                else:
+                    sell_amount = book.sell(coin, sell_quantity)
+                    results.append({'coin_name': coin.Name, 'status': 'executed', 'message': f'INR {sell_amount:f} added to your wallet'})
+            except CustomError as e:
+                results.append({'coin_name': coin.Name, 'status': 'rejected', 'message': e.detail['message'][0]})
+        book.save()
+    return results
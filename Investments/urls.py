@@ -3,8 +3,10 @@ from .views import *
 
 
 urlpatterns = [
+    path('quote/', QuoteView.as_view()),
     path('buy/', BuyCoinView.as_view()),
     path('sell/', SellCoinView.as_view()),
+    path('orders/', BatchOrderView.as_view()),
     path('myholdings/', GETMyHoldingsView.as_view()),
     path('mywatchlist/', MyWatchlistView.as_view()),
     path('news/', NEWSView.as_view()),
@@ -1,18 +1,43 @@
+from decimal import Decimal
 from Authentication.utils import CustomError
+from django.db.models import F
+from .models import Coin
 
 
-def update_my_holdings(obj, coinname, number_of_coins):
-    found = False
-    updated_holdings = []
-    for i in obj.MyHoldings:
-        if i[0] == coinname:
-            found = True
-            if round( float(i[1]) + number_of_coins, 8) == 0:
-                continue
-            updated_holdings.append([i[0], round( float(i[1]) + number_of_coins, 8)])
-        else:
-            updated_holdings.append(i)
-    if not found : 
-        updated_holdings.append([coinname, number_of_coins])
-    obj.MyHoldings = updated_holdings
-    obj.save()
\ No newline at end of file
+# money and quantities are stored with 8 decimal places
+EIGHT = Decimal('1e-8')
+UNITS = 10 ** 8
+
+
+def to_decimal(value):
+    return Decimal(str(value)).quantize(EIGHT)
+
+
+def to_units(value):
+    """Value as an integer count of 1e-8, exact for anything with at most 8 decimal places"""
+    return int(Decimal(str(value or 0)).scaleb(8).to_integral_value())
+
+
+def from_units(units):
+    return units / UNITS
+
+
+def coin_values(queryset=None):
+    """Coins as dicts in the format sent to the clients, with the price as a float"""
+    if queryset is None:
+        queryset = Coin.objects.all()
+    coins = list(queryset.values('Name', 'FullName', 'Price', 'ChangePct', ImageURL=F('Image')))
+    for coin in coins:
+        if coin['Price'] is not None:
+            coin['Price'] = float(coin['Price'])
+    return coins
+
+
+def resolve_coins(names, snapshot=None):
+    """
+    Returns {name : coin dict} for the given coin names with a single Name__in query,
+    or from snapshot, a {name : coin dict} already loaded in memory
+    """
+    if snapshot is not None:
+        return {name: snapshot[name] for name in names if name in snapshot}
+    return {coin['Name']: coin for coin in coin_values(Coin.objects.filter(Name__in=names))}
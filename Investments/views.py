@@ -4,8 +4,10 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
-from django.db.models.functions import Greatest
-from django.contrib.postgres.search import TrigramSimilarity
+from rest_framework.pagination import CursorPagination
+from .cache import CachedGetMixin
+from .search import get_search_index
+from django.conf import settings
 
 
 class BuyCoinView(CreateAPIView):
@@ -28,15 +30,36 @@ class SellCoinView(APIView):
         return Response(data, status=status.HTTP_202_ACCEPTED)
 
 
+class QuoteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = QuoteSerializer(data = request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.create(serializer.validated_data)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class BatchOrderView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = BatchOrderSerializer(data = request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.create(serializer.validated_data)
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+
 class GETMyHoldingsView(RetrieveAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = MyHoldingsSerializer
     
     def get_object(self):
         try : 
-            return MyHoldings.objects.get(user = self.request.user)
-        except : 
+            self.request.user.pan_details
+        except ObjectDoesNotExist : 
             raise CustomError("Verify yourself with PAN to trade", code=status.HTTP_406_NOT_ACCEPTABLE)
+        return self.request.user
 
 
 class MyWatchlistView(RetrieveUpdateAPIView):
@@ -51,43 +74,51 @@ class MyWatchlistView(RetrieveUpdateAPIView):
         return obj
 
 
-class NEWSView(ListAPIView):
+class NEWSView(CachedGetMixin, ListAPIView):
+    version_key = settings.NEWS_VERSION_KEY
     permission_classes = [IsAuthenticated]
     serializer_class = NEWSSerializer
     queryset = News.objects.all()
 
 
-class CoinDetailsView(RetrieveAPIView):
+class CoinDetailsView(CachedGetMixin, RetrieveAPIView):
+    version_key = settings.COINS_VERSION_KEY
     permission_classes = [IsAuthenticated]
     serializer_class = CoinSerializer
 
+    def validate(self, request):
+        if get_coin(request.GET.get("coin")) is None:
+            raise CustomError("Invalid Coin Requested")
+
     def get_object(self):
-        coin = self.request.GET.get("coin")
-        try:
-            return Coin.objects.get(Name = coin)
-        except:
+        coin = Coin.objects.filter(Name = self.request.GET.get("coin")).first()
+        if coin is None:
             raise CustomError("Invalid Coin Requested")
+        return coin
+
 
+class TransactionsPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-timestamp', '-id')
 
-class TransactionsView(RetrieveAPIView):
+
+class TransactionsView(ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = TransactionsSerializer
+    pagination_class = TransactionsPagination
 
-    def get_object(self):
-        try:
-            return TransactionHistory.objects.get(user = self.request.user)
-        except:
-            return []
+    def get_queryset(self):
+        return Transaction.objects.filter(user = self.request.user).select_related('coin')
 
 
 class InWatchlistView(RetrieveAPIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        coin = request.GET.get("coin")
-        try:
-            coin = Coin.objects.get(Name = coin)
-        except:
+        coin = get_coin(request.GET.get("coin"))
+        if coin is None:
             raise CustomError("Invalid Coin Requested")
         boool = False
         obj = MyWatchlist.objects.get_or_create(user = request.user)
@@ -96,15 +127,10 @@ class InWatchlistView(RetrieveAPIView):
         return Response({'present' : boool})
 
 
-class SearchView(RetrieveAPIView):
+class SearchView(CachedGetMixin, RetrieveAPIView):
+    version_key = settings.CATALOG_VERSION_KEY
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, *args, **kwargs):
-        search = request.GET.get("search")
-        coins = Coin.objects.annotate( similarity=Greatest(
-                TrigramSimilarity('Name', search), TrigramSimilarity('FullName', search)
-            )).filter(similarity__gte=0.3).order_by('-similarity')
-        result = {}
-        for coin in coins:
-            result.update({ coin.Name : coin.FullName})
-        return Response(result)
\ No newline at end of file
+    def retrieve(self, request, *args, **kwargs):
+        search = request.GET.get("search") or ''
+        return Response(dict(get_search_index().search(search)))
\ No newline at end of file
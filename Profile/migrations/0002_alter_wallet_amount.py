@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-17 22:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='wallet',
+            name='amount',
+            field=models.DecimalField(decimal_places=8, default=10000, max_digits=20),
+        ),
+    ]
@@ -1,11 +1,10 @@
 from django.db.models.base import Model
-from django.db.models.fields import FloatField, CharField
+from django.db.models.fields import DecimalField, CharField
 from django.db.models.fields.related import OneToOneField
 from django.db.models import CASCADE
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.core.validators import RegexValidator
-from Investments.models import MyHoldings, TransactionHistory
 import string
 import random
 from Authentication.models import User
@@ -20,13 +19,11 @@ class PAN_Verification(Model):
 def create_referal_code(sender, instance, created, **kwargs):
     if created:
         Wallet.objects.create(user = instance.user)
-        MyHoldings.objects.create(user =instance. user,  MyHoldings = [])
-        TransactionHistory.objects.create(user = instance.user, transactions = [])
 
 
 class Wallet(Model):
     user = OneToOneField(User, on_delete=CASCADE, related_name='wallet')
-    amount = FloatField(default=10000)
+    amount = DecimalField(max_digits=20, decimal_places=8, default=10000)
     referal = CharField(max_length=6, null=True, blank=True)
 
 @receiver(post_save, sender=Wallet)
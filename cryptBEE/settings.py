@@ -158,7 +158,9 @@ REST_FRAMEWORK = {
     # or allow read-only access for unauthenticated users.
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ]
+    ],
+    # money is stored as Decimal, keep sending it as JSON numbers
+    'COERCE_DECIMAL_TO_STRING': False,
 }
 
 
@@ -225,4 +227,55 @@ CELERY_RESULT_BACKEND = 'django-db'
 #CELERY BEAT
 #celery -A cryptBEE beat -l info
 
-CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
\ No newline at end of file
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+
+
+#COINS PRICE FEED
+
+CRYPTOCOMPARE_API_URL = os.environ.get('CRYPTOCOMPARE_API_URL', 'https://min-api.cryptocompare.com/data/')
+COINS_BATCH_SIZE = int(os.environ.get('COINS_BATCH_SIZE', 50))
+COINS_FETCH_WORKERS = int(os.environ.get('COINS_FETCH_WORKERS', 4))
+
+REDIS_URL = os.environ.get('REDIS_URL', CELERY_BROKER_URL)
+COINS_CHANNEL = 'coins'
+TRADES_CHANNEL = 'trades'
+COINS_PRICES_KEY = 'coins:prices'
+COINS_VERSION_KEY = 'coins:version'
+COINS_CACHE_KEY = 'coins:cache:'
+COINS_CACHE_TTL = 60
+COINS_CACHE_CHECK = float(os.environ.get('COINS_CACHE_CHECK', 1))
+CATALOG_VERSION_KEY = 'coins:catalog:version'
+NEWS_VERSION_KEY = 'news:version'
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 600))
+
+# responses of CachedGetMixin, shared by every backend process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'responses',
+    }
+}
+
+
+#QUOTES
+
+QUOTE_KEY = 'quote:'
+QUOTE_TTL = int(os.environ.get('QUOTE_TTL', 15))
+QUOTE_TOLERANCE = os.environ.get('QUOTE_TOLERANCE', '0.005')
+
+
+#WEBSOCKET
+#python websocket.py --workers 4
+
+WEBSOCKET_INTERVAL = 10
+WEBSOCKET_PUSH = bool(os.environ.get('WEBSOCKET_PUSH', 'False') == 'True')
+WEBSOCKET_MIN_INTERVAL = float(os.environ.get('WEBSOCKET_MIN_INTERVAL', 1))
+WEBSOCKET_HEARTBEAT = int(os.environ.get('WEBSOCKET_HEARTBEAT', 20))
+WEBSOCKET_COMPRESSION = os.environ.get('WEBSOCKET_COMPRESSION', 'shared')
+WEBSOCKET_MAX_PENDING = int(os.environ.get('WEBSOCKET_MAX_PENDING', 64))
+WEBSOCKET_SLOW_CLIENT_TIMEOUT = int(os.environ.get('WEBSOCKET_SLOW_CLIENT_TIMEOUT', 30))
+WEBSOCKET_REGISTRY_KEY = 'websocket:connections:'
+WEBSOCKET_REGISTRY_TTL = int(os.environ.get('WEBSOCKET_REGISTRY_TTL', 30))
+WEBSOCKET_STATS_KEY = 'websocket:stats:'
+WEBSOCKET_WORKERS = int(os.environ.get('WEBSOCKET_WORKERS', 1))
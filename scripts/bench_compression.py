@@ -0,0 +1,82 @@
+"""
+Bytes on the wire and compression CPU per client for WEBSOCKET_COMPRESSION off, deflate and shared.
+
+Every client gets the ALL frame of each tick, the shared coins data followed by its own holdings,
+encoded by the permessage-deflate extension the server would negotiate for it.
+
+Usage:
+    python scripts/bench_compression.py --clients 200 --ticks 10 --coins 400
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'bench')
+
+from websockets.frames import Frame, OP_TEXT
+from websocket import PerMessageDeflate, SharedDeflate
+
+
+def extension(mode):
+    # same window and memLevel as compression_options()
+    if mode == 'deflate':
+        return PerMessageDeflate(False, False, 12, 12, {'memLevel': 5})
+    return SharedDeflate(False, True, 12, 12, {'memLevel': 5})
+
+
+def make_coins(count):
+    return [{'Name': f'C{i}', 'FullName': f'Coin number {i}', 'Price': round(random.uniform(0.01, 5e6), 8),
+             'ChangePct': round(random.uniform(-5, 5), 8), 'ImageURL': f'cryptocompare.com/media/{i}.png'} for i in range(count)]
+
+
+def tick_frames(coins, clients):
+    for coin in random.sample(coins, len(coins) // 10):
+        coin['Price'] = round(coin['Price'] * random.uniform(0.99, 1.01), 8)
+    shared = json.dumps(coins)
+    frames = ['{"data": ' + shared + ', "holdings": ' + json.dumps([{'Name': 'C%d' % client, 'Coins': client / 7}])
+              + ', "watchlist": []}' for client in range(clients)]
+    return shared, frames
+
+
+def run(mode, clients, ticks, coins):
+    random.seed(1)
+    coins = make_coins(coins)
+    extensions = [extension(mode) for _ in range(clients)] if mode != 'off' else None
+    sent = 0
+    cpu = 0
+    for _ in range(ticks):
+        shared, frames = tick_frames(coins, clients)
+        start = time.process_time()
+        if mode == 'shared':
+            SharedDeflate.share('{"data": ' + shared, reset=True)
+        for client, frame in enumerate(frames):
+            data = frame.encode()
+            if extensions is not None:
+                data = extensions[client].encode(Frame(OP_TEXT, data)).data
+            sent += len(data)
+        cpu += time.process_time() - start
+        if mode == 'shared':
+            # frames without context takeover decode on their own
+            assert zlib.decompressobj(-12).decompress(data + b'\x00\x00\xff\xff') == frames[-1].encode()
+    return sent / (clients * ticks), cpu / (clients * ticks), len(frames[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='websocket compression benchmark')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--ticks', type=int, default=10)
+    parser.add_argument('--coins', type=int, default=400)
+    args = parser.parse_args()
+    print(f'{args.clients} clients, {args.ticks} ticks, {args.coins} coins')
+    for mode in ('off', 'deflate', 'shared'):
+        sent, cpu, raw = run(mode, args.clients, args.ticks, args.coins)
+        print(f'{mode:8} {sent:10.0f} bytes/frame ({raw} raw)  {cpu * 1e6:8.1f} us cpu/client/tick')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Time per query of SearchIndex against a full scan computing the pg_trgm similarity of every coin,
+and the number of queries where the two disagree on the coins at or above the threshold.
+
+Usage:
+    python scripts/bench_search.py --coins 300 --queries 100
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cryptBEE.settings')
+
+import django
+django.setup()
+
+from Investments.search import SearchIndex, trigrams
+
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    return len(a & b) / len(a | b) if a | b else 0
+
+
+def full_scan(coins, query, threshold):
+    scores = {coin: max(similarity(coin[0], query), similarity(coin[1], query)) for coin in coins}
+    return sorted((coin for coin, score in scores.items() if score >= threshold), key=lambda coin: (-scores[coin], coin[0])), scores
+
+
+def make_coins(count):
+    random.seed(3)
+    word = lambda: ''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 9))).title()
+    return [(''.join(random.choices(string.ascii_uppercase, k=random.randint(2, 5))) + str(i),
+             ' '.join(word() for _ in range(random.randint(1, 3)))) for i in range(count)]
+
+
+def timed(function, queries):
+    start = time.perf_counter()
+    results = [function(query) for query in queries]
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='coin search benchmark')
+    parser.add_argument('--coins', type=int, default=300)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--threshold', type=float, default=0.3)
+    args = parser.parse_args()
+    coins = make_coins(args.coins)
+    sample = random.sample(coins, min(args.queries, len(coins)))
+    queries = [fullname for name, fullname in sample[::2]] + [fullname[:4] for name, fullname in sample[1::2]]
+
+    start = time.perf_counter()
+    index = SearchIndex(coins)
+    build = time.perf_counter() - start
+    indexed, found = timed(lambda query: index.search(query, args.threshold), queries)
+    scanned, expected = timed(lambda query: full_scan(coins, query, args.threshold), queries)
+    mismatches = sum([coin for coin in got if scores[coin] >= args.threshold] != matches
+                     for got, (matches, scores) in zip(found, expected))
+
+    print(f'{len(coins)} coins, {len(queries)} queries, index built in {build * 1e3:.1f} ms')
+    print(f'index     {indexed * 1e6:9.1f} us/query')
+    print(f'full scan {scanned * 1e6:9.1f} us/query')
+    print(f'mismatches {mismatches} of {len(queries)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Time of valuing every PROFIT subscriber once per tick, the float valuation the websocket used before
+against the current Valuation in integer counts of 1e-8, and how far apart their totals are.
+
+Usage:
+    python scripts/bench_valuation.py --users 1000 --holdings 20 --coins 300 --ticks 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+from operator import mul
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'bench')
+
+from websocket import Valuation
+from Investments.utils import to_units
+
+
+class FloatValuation:
+    """Valuation before the decimal columns, floats summed and rounded to 8 places"""
+
+    def __init__(self, wallet, holdings):
+        self.wallet = float(wallet)
+        self.names = [holding[0] for holding in holdings]
+        self.quantities = [float(holding[1]) for holding in holdings]
+
+    def frame(self, snapshot):
+        prices = [(snapshot[name]['Price'] or 0) if name in snapshot else 0 for name in self.names]
+        holdings_value = round(sum(map(mul, self.quantities, prices)), 8)
+        return json.dumps({'wallet': self.wallet, 'holdings_value' : holdings_value, 'total' : self.wallet+holdings_value})
+
+
+def make_book(users, holdings, coins):
+    random.seed(1)
+    names = [f'C{i}' for i in range(coins)]
+    prices = {name: Decimal(random.uniform(1e-4, 5e6)).quantize(Decimal('1e-8')) for name in names}
+    books = [(Decimal(random.uniform(0, 1e6)).quantize(Decimal('1e-8')),
+              [(name, Decimal(random.uniform(1e-6, 100)).quantize(Decimal('1e-8'))) for name in random.sample(names, holdings)])
+             for _ in range(users)]
+    return prices, books
+
+
+def timed(valuations, argument, ticks):
+    start = time.perf_counter()
+    for _ in range(ticks):
+        frames = [valuation.frame(argument) for valuation in valuations]
+    return (time.perf_counter() - start) / ticks, frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='websocket profit valuation benchmark')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--holdings', type=int, default=20)
+    parser.add_argument('--coins', type=int, default=300)
+    parser.add_argument('--ticks', type=int, default=20)
+    args = parser.parse_args()
+    prices, books = make_book(args.users, args.holdings, args.coins)
+
+    snapshot = {name: {'Price': float(price)} for name, price in prices.items()}
+    before, float_frames = timed([FloatValuation(*book) for book in books], snapshot, args.ticks)
+    units = {name: to_units(price) for name, price in prices.items()}
+    after, int_frames = timed([Valuation(*book) for book in books], units, args.ticks)
+
+    exact = [wallet + sum(quantity * prices[name] for name, quantity in holdings) for wallet, holdings in books]
+    def error(frames):
+        return max(abs(Decimal(repr(json.loads(frame)['total'])) - total.quantize(Decimal('1e-8'))) for frame, total in zip(frames, exact))
+
+    print(f'{args.users} users x {args.holdings} holdings over {args.coins} coins')
+    print(f'before (float) {before * 1e3:7.2f} ms per tick  {args.users / before:9.0f} valuations/s  max error {error(float_frames):f}')
+    print(f'after (int)    {after * 1e3:7.2f} ms per tick  {args.users / after:9.0f} valuations/s  max error {error(int_frames):f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,26 @@
 import websockets
 import asyncio
 import os
+import time
+import signal
+import argparse
+import multiprocessing
+import platform
 import django
 import json
+import functools
+from operator import mul
+from itertools import repeat
 from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import close_old_connections
 import jwt
+import zlib
+import dataclasses
+import msgpack
+import redis.asyncio as aioredis
+from websockets.frames import OP_TEXT, OP_BINARY
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
 
 import logging
 logging.basicConfig(format="%(message)s", level=logging.DEBUG)
@@ -14,11 +29,22 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cryptBEE.settings')
 django.setup()
 
 from Authentication.models import User
-from Investments.models import Coin
+from Investments.models import Holding, MyWatchlist
+from Investments.utils import coin_values, resolve_coins, to_units, from_units, UNITS
+from Profile.models import Wallet
 from django_celery_beat.models import PeriodicTask, IntervalSchedule
 
 
-@sync_to_async
+def database(function):
+    """sync_to_async that first replaces a broken or expired database connection, so a database restart only fails one call"""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        return function(*args, **kwargs)
+    return sync_to_async(wrapper)
+
+
+@database
 def AddToCeleryBeat():
     task = PeriodicTask.objects.filter(name = 'update_coins_data')
     if not task.exists():
@@ -26,161 +52,751 @@ def AddToCeleryBeat():
         task = PeriodicTask.objects.create(interval = schedule, name = 'update_coins_data', task = 'Investments.tasks.update_coins')
 
 
-@sync_to_async
+@database
 def RemoveFromCeleryBeat():
     task = PeriodicTask.objects.filter(name = 'update_coins_data')
     if task.exists():
         task.delete()
 
 
-@sync_to_async
-def holdings_data(user):
+class SubscriberRegistry:
+    """
+    Keeps the connection count of this process in Redis under its own key with a TTL,
+    so the count of a crashed process expires. update_coins stays in celery beat
+    while any process in the cluster has a connection.
+    """
+
+    def __init__(self, ttl=30):
+        self.node = f'{platform.node()}:{os.getpid()}'
+        self.key = settings.WEBSOCKET_REGISTRY_KEY + self.node
+        self.ttl = ttl
+        self.connections = 0
+        self.redis = aioredis.from_url(settings.REDIS_URL)
+
+    async def connect(self):
+        self.connections += 1
+        if self.connections == 1:
+            try:
+                await self.sync()
+            except BaseException:
+                # the connection is not counted, run() corrects the key and the beat task on its next sync
+                self.connections -= 1
+                raise
+
+    async def disconnect(self):
+        self.connections -= 1
+        if self.connections == 0:
+            await self.sync()
+
+    async def total(self):
+        total = 0
+        async for key in self.redis.scan_iter(match = settings.WEBSOCKET_REGISTRY_KEY + '*'):
+            total += int(await self.redis.get(key) or 0)
+        return total
+
+    async def sync(self):
+        try:
+            if self.connections:
+                await self.redis.set(self.key, self.connections, ex = self.ttl)
+            else:
+                await self.redis.delete(self.key)
+            total = await self.total()
+        except aioredis.RedisError as e:
+            logging.warning('%s, using the connections of this process only', e)
+            total = self.connections
+        if total:
+            await AddToCeleryBeat()
+        else:
+            await RemoveFromCeleryBeat()
+
+    async def report(self):
+        stats = {'connections': self.connections, **broadcaster.stats()}
+        logging.info('websocket worker %s : %s', self.node, stats)
+        try:
+            await self.redis.set(settings.WEBSOCKET_STATS_KEY + self.node, json.dumps(stats), ex = self.ttl)
+        except aioredis.RedisError:
+            pass
+
+    async def run(self):
+        """
+        Refreshes the TTL, lets idle processes remove the beat task left by crashed ones
+        and reports the connections and send latency of this process
+        """
+        while True:
+            try:
+                await self.sync()
+                await self.report()
+            except Exception:
+                logging.exception('websocket worker %s : registry sync failed', self.node)
+            await asyncio.sleep(self.ttl / 3)
+
+
+def user_holdings(user):
+    return list(Holding.objects.filter(user = user).values_list('coin__Name', 'quantity'))
+
+
+def user_watchlist(user):
+    return MyWatchlist.objects.filter(user = user).values_list('watchlist', flat = True).first() or []
+
+
+@database
+def holdings_data(user, snapshot=None):
     holdings = []
-    try:
-        for holding in user.my_holdings.MyHoldings:
-            coin = Coin.objects.get(Name = holding[0])
-            holdings.append({"Name" : coin.Name, "FullName": coin.FullName, "Price": coin.Price,"ImageURL" : coin.Image, "Coins" : holding[1]})
-    except:
-        pass
+    my_holdings = user_holdings(user)
+    coins = resolve_coins([holding[0] for holding in my_holdings], snapshot)
+    for holding in my_holdings:
+        if holding[0] in coins:
+            coin = coins[holding[0]]
+            holdings.append({"Name" : coin['Name'], "FullName": coin['FullName'], "Price": coin['Price'],"ImageURL" : coin['ImageURL'], "Coins" : float(holding[1])})
     return holdings
 
 
-@sync_to_async
-def particular_holdings_data(user, reqd_coin):
+@database
+def particular_holdings_data(user, coin):
     holdings = []
-    try:
-        for holding in user.my_holdings.MyHoldings:
-            coin = Coin.objects.get(Name = holding[0])
-            if reqd_coin == coin:
-                holdings.append({"Name" : coin.Name, "FullName": coin.FullName, "Price": coin.Price,"ImageURL" : coin.Image, "Coins" : holding[1]})
-                break
-    except:
-        pass
+    for holding in user_holdings(user):
+        if holding[0] == coin['Name']:
+            holdings.append({"Name" : coin['Name'], "FullName": coin['FullName'], "Price": coin['Price'],"ImageURL" : coin['ImageURL'], "Coins" : float(holding[1])})
+            break
     return holdings
 
 
-@sync_to_async
-def watchlist_data(user):
+@database
+def watchlist_data(user, snapshot=None):
     watchlist = []
-    try:
-        for watch in user.watchlist.watchlist:
-            coin = Coin.objects.get(Name = watch)
-            watchlist.append({'Name': coin.Name, 'FullName' : coin.FullName, 'Price': coin.Price, 'ChangePct': coin.ChangePct, 'ImageURL': coin.Image})
-    except:
-        pass
+    names = user_watchlist(user)
+    coins = resolve_coins(names, snapshot)
+    for name in names:
+        if name in coins:
+            watchlist.append(coins[name])
     return watchlist
 
 
-async def socket(websocket, user):
-    try:
-        while True:
-            coins = Coin.objects.all()
-            data = []
-            async for coin in coins:
-                data.append({'Name': coin.Name, 'FullName' : coin.FullName, 'Price': coin.Price, 'ChangePct': coin.ChangePct, 'ImageURL': coin.Image})
-            holdings = await holdings_data(user)
-            watchlist = await watchlist_data(user)
-            await websocket.send(json.dumps({'data': data, 'holdings' : holdings, 'watchlist' : watchlist}))
-            await asyncio.sleep(10)
-    except:
-        return
+@database
+def get_coins():
+    return list(coin_values())
 
 
-async def single_socket(websocket, user, req):
-    try:
+class SharedDeflate(PerMessageDeflate):
+    """
+    permessage-deflate without server context takeover, so a message is compressed the same way
+    for every connection. The shared prefixes registered for the current tick are compressed once
+    per window size and only the rest of each message is compressed per connection.
+    """
+
+    prefixes = {}
+
+    @classmethod
+    def share(cls, prefix, reset = False):
+        if reset:
+            cls.prefixes = {}
+        cls.prefixes[prefix.encode() if isinstance(prefix, str) else prefix] = {}
+
+    def encode(self, frame):
+        if frame.opcode not in (OP_TEXT, OP_BINARY) or not frame.fin or not self.local_no_context_takeover:
+            return super().encode(frame)
+        for prefix, compressed in self.prefixes.items():
+            if frame.data.startswith(prefix):
+                break
+        else:
+            return super().encode(frame)
+        wbits = self.local_max_window_bits
+        if wbits not in compressed:
+            encoder = zlib.compressobj(wbits = -wbits, **self.compress_settings)
+            compressed[wbits] = encoder.compress(prefix) + encoder.flush(zlib.Z_SYNC_FLUSH)
+        encoder = zlib.compressobj(wbits = -wbits, **self.compress_settings)
+        data = compressed[wbits] + encoder.compress(frame.data[len(prefix):]) + encoder.flush(zlib.Z_SYNC_FLUSH)
+        if data.endswith(b'\x00\x00\xff\xff'):
+            data = data[:-4]
+        return dataclasses.replace(frame, data = data, rsv1 = True)
+
+
+class SharedDeflateFactory(ServerPerMessageDeflateFactory):
+
+    def process_request_params(self, params, accepted_extensions):
+        response, extension = super().process_request_params(params, accepted_extensions)
+        return response, SharedDeflate(extension.remote_no_context_takeover, extension.local_no_context_takeover,
+                                       extension.remote_max_window_bits, extension.local_max_window_bits, extension.compress_settings)
+
+
+def compression_options(mode):
+    """websockets.serve arguments for WEBSOCKET_COMPRESSION off, deflate (per connection) or shared"""
+    if mode == 'off':
+        return {'compression': None}
+    if mode == 'shared':
+        return {'extensions': [SharedDeflateFactory(server_no_context_takeover = True, server_max_window_bits = 12,
+                                                    client_max_window_bits = 12, compress_settings = {'memLevel': 5})]}
+    return {}
+
+
+class Valuation:
+    """
+    Wallet amount and holdings of a user, the holdings are kept as a names and a quantities vector.
+    Amounts are integer counts of 1e-8 so the value is summed exactly
+    """
+
+    def __init__(self, wallet, holdings):
+        self.wallet = to_units(wallet)
+        self.names = [holding[0] for holding in holdings]
+        self.quantities = [to_units(holding[1]) for holding in holdings]
+
+    def holds(self, changed):
+        return changed is None or not changed.isdisjoint(self.names)
+
+    def frame(self, prices):
+        """prices : {name : price in units}"""
+        holdings_value = (sum(map(mul, self.quantities, map(prices.get, self.names, repeat(0)))) + UNITS // 2) // UNITS
+        return json.dumps({'wallet': from_units(self.wallet), 'holdings_value' : from_units(holdings_value),
+                           'total' : from_units(self.wallet + holdings_value)})
+
+
+@database
+def get_valuation(user):
+    wallet = Wallet.objects.filter(user = user).values_list('amount', flat = True).first() or 0
+    return Valuation(wallet, user_holdings(user))
+
+
+class Client:
+    """
+    Frames waiting to be sent to one connection, written by its own task so a slow client
+    never holds up the others. Frames are keyed by stream, a newer frame replaces an unsent
+    older one of the same key. A client is dropped when its oldest unsent frame is older than
+    timeout or more than max_pending frames are waiting.
+    """
+
+    def __init__(self, websocket, broadcaster, max_pending, timeout):
+        self.websocket = websocket
+        self.broadcaster = broadcaster
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = {}
+        self.behind_since = None
+        self.ready = asyncio.Event()
+        self.task = asyncio.create_task(self.write())
+
+    def push(self, key, frame):
+        if key in self.pending:
+            self.broadcaster.conflated += 1
+        elif self.behind_since is None:
+            self.behind_since = time.monotonic()
+        self.pending[key] = frame
+        if len(self.pending) > self.max_pending or time.monotonic() - self.behind_since > self.timeout:
+            self.drop()
+        else:
+            self.ready.set()
+
+    def drop(self):
+        logging.warning('dropping slow client %s', self.websocket.remote_address)
+        self.broadcaster.dropped += 1
+        self.broadcaster.remove(self.websocket)
+        # kept until done, the event loop only holds a weak reference to its tasks
+        task = asyncio.create_task(self.websocket.close(1013, 'slow consumer'))
+        self.broadcaster.closing.add(task)
+        task.add_done_callback(self.broadcaster.closing.discard)
+
+    def close(self):
+        self.task.cancel()
+        self.pending.clear()
+
+    async def write(self):
         while True:
-            coin = await get_coin(req)
-            data = {'Name': coin.Name, 'FullName' : coin.FullName, 'Price': coin.Price, 'ChangePct': coin.ChangePct, 'ImageURL': coin.Image}
-            holdings = await particular_holdings_data(user, coin)
-            await websocket.send(json.dumps({'data': data, 'holdings' : holdings}))
-            await asyncio.sleep(10)
-    except:
-        return
+            await self.ready.wait()
+            self.ready.clear()
+            while self.pending:
+                key = next(iter(self.pending))
+                frame = self.pending.pop(key)
+                start = time.perf_counter()
+                try:
+                    async with asyncio.timeout(self.timeout):
+                        await self.websocket.send(frame)
+                except TimeoutError:
+                    self.drop()
+                    return
+                except websockets.ConnectionClosed:
+                    return
+                self.broadcaster.sent(time.perf_counter() - start)
+            self.behind_since = None
+
+
+class Broadcaster:
+    """
+    Loads the coins once per tick for the whole process and serializes them once,
+    every ALL subscriber gets the same encoded data with its own holdings and watchlist.
+    Single coin subscribers are kept in topics by coin name and share the encoded coin.
+    PROFIT subscribers share a cached Valuation per user, reloaded only after the user trades.
+    DELTA subscribers get one snapshot, then only the coins whose price changed, numbered by seq.
+
+    In push mode a tick happens only when update_coins publishes a diff on COINS_CHANNEL,
+    at most once every min_interval seconds, otherwise every interval seconds.
+    Frames are queued on a Client per connection.
+    """
+
+    def __init__(self, interval=10, push=False, min_interval=1, max_pending=64, timeout=30):
+        self.interval = interval
+        self.push = push
+        self.min_interval = min_interval
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.clients = {}
+        self.closing = set()
+        self.subscribers = {}
+        self.topics = {}
+        self.profits = {}
+        self.valuations = {}
+        self.deltas = {}
+        self.binary = set()
+        self.user_frames = {}
+        self.coins = []
+        self.by_name = {}
+        self.prices = {}
+        self.shared = None
+        self.seq = 0
+        self.delta = None
+        self.encoded = {}
+        self.pending = set()
+        self.traded = set()
+        self.dirty = asyncio.Event()
+        self.frames = 0
+        self.send_time = 0
+        self.max_send_time = 0
+        self.conflated = 0
+        self.dropped = 0
+
+    def attach(self, websocket):
+        """Queues frames for the connection until remove(), called once by the connection handler"""
+        self.clients[websocket] = Client(websocket, self, self.max_pending, self.timeout)
+
+    def send(self, websocket, key, frame):
+        # frames built during a tick for a connection removed meanwhile are dropped
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.push(key, frame)
+
+    def sent(self, elapsed):
+        self.frames += 1
+        self.send_time += elapsed
+        self.max_send_time = max(self.max_send_time, elapsed)
+
+    def remove(self, websocket):
+        self.unsubscribe(websocket)
+        self.unsubscribe_topic(websocket)
+        self.unsubscribe_profit(websocket)
+        self.unsubscribe_delta(websocket)
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            client.close()
+
+    def stats(self):
+        """Frames sent, their send latency, conflated frames and dropped clients since the last call"""
+        stats = {'frames': self.frames,
+                 'avg_send_ms': round(self.send_time / self.frames * 1000, 3) if self.frames else 0,
+                 'max_send_ms': round(self.max_send_time * 1000, 3),
+                 'conflated': self.conflated,
+                 'dropped': self.dropped}
+        self.frames = 0
+        self.send_time = 0
+        self.max_send_time = 0
+        self.conflated = 0
+        self.dropped = 0
+        return stats
+
+    async def load(self):
+        coins = await get_coins()
+        by_name = {coin['Name']: coin for coin in coins}
+        if by_name.keys() == self.by_name.keys():
+            delta = [[coin['Name'], coin['Price'], coin['ChangePct']] for coin in coins
+                     if (coin['Price'], coin['ChangePct']) != (self.by_name[coin['Name']]['Price'], self.by_name[coin['Name']]['ChangePct'])]
+        else:
+            delta = None
+        if delta != []:
+            self.seq += 1
+        self.delta = delta
+        self.coins = coins
+        self.by_name = by_name
+        self.prices = {coin['Name']: to_units(coin['Price']) for coin in coins}
+        self.shared = json.dumps(self.coins)
+        self.encoded = {}
+        SharedDeflate.share('{"data": ' + self.shared, reset = True)
+
+    def encode(self, kind, binary):
+        """Snapshot or delta of the current seq, encoded once per tick for all DELTA subscribers"""
+        if (kind, binary) not in self.encoded:
+            frame = {'type': kind, 'seq': self.seq, 'data': self.coins if kind == 'snapshot' else self.delta}
+            self.encoded[kind, binary] = msgpack.packb(frame) if binary else json.dumps(frame)
+            SharedDeflate.share(self.encoded[kind, binary])
+        return self.encoded[kind, binary]
+
+    async def subscribe(self, websocket, user):
+        if self.shared is None:
+            await self.load()
+        self.subscribers[websocket] = user
+        await self.send_all(websocket, user, self.shared)
+
+    def unsubscribe(self, websocket):
+        self.subscribers.pop(websocket, None)
+
+    async def send_all(self, websocket, user, shared):
+        holdings = await holdings_data(user, self.by_name)
+        watchlist = await watchlist_data(user, self.by_name)
+        self.send(websocket, 'ALL', '{"data": ' + shared + ', "holdings": ' + json.dumps(holdings) + ', "watchlist": ' + json.dumps(watchlist) + '}')
+
+    async def subscribe_topic(self, websocket, user, name):
+        if self.shared is None:
+            await self.load()
+        if name not in self.by_name:
+            return False
+        self.topics.setdefault(name, {})[websocket] = user
+        coin = self.by_name[name]
+        await self.send_topic(websocket, user, coin, json.dumps(coin))
+        return True
+
+    def unsubscribe_topic(self, websocket, name=None):
+        for topic in ([name] if name else list(self.topics)):
+            subscribers = self.topics.get(topic, {})
+            subscribers.pop(websocket, None)
+            if not subscribers:
+                self.topics.pop(topic, None)
+
+    async def send_topic(self, websocket, user, coin, shared):
+        holdings = await particular_holdings_data(user, coin)
+        self.send(websocket, coin['Name'], '{"data": ' + shared + ', "holdings": ' + json.dumps(holdings) + '}')
+
+    async def subscribe_profit(self, websocket, user):
+        if self.shared is None:
+            await self.load()
+        if user.id not in self.valuations:
+            self.valuations[user.id] = await get_valuation(user)
+        self.profits[websocket] = user
+        self.send(websocket, 'PROFIT', self.valuations[user.id].frame(self.prices))
+
+    def unsubscribe_profit(self, websocket):
+        user = self.profits.pop(websocket, None)
+        if user is not None and user not in self.profits.values():
+            self.valuations.pop(user.id, None)
+
+    async def subscribe_delta(self, websocket, user, binary):
+        if self.shared is None:
+            await self.load()
+        self.deltas[websocket] = user
+        if binary:
+            self.binary.add(websocket)
+        self.resync(websocket)
+        await self.send_user(websocket, user)
+
+    def unsubscribe_delta(self, websocket):
+        self.deltas.pop(websocket, None)
+        self.binary.discard(websocket)
+        self.user_frames.pop(websocket, None)
+
+    def resync(self, websocket):
+        self.send(websocket, 'DELTA', self.encode('snapshot', websocket in self.binary))
+
+    def send_delta(self, websocket):
+        """A delta replacing an unsent one would leave a gap in seq, so the snapshot is sent instead"""
+        client = self.clients.get(websocket)
+        if self.delta is None or (client is not None and 'DELTA' in client.pending):
+            self.resync(websocket)
+        else:
+            self.send(websocket, 'DELTA', self.encode('delta', websocket in self.binary))
+
+    async def send_user(self, websocket, user):
+        """Sends the holdings and watchlist of the user only when they changed"""
+        holdings = await holdings_data(user, self.by_name)
+        watchlist = await watchlist_data(user, self.by_name)
+        frame = {'type': 'user', 'holdings': holdings, 'watchlist': watchlist}
+        frame = msgpack.packb(frame) if websocket in self.binary else json.dumps(frame)
+        if self.user_frames.get(websocket) != frame:
+            self.user_frames[websocket] = frame
+            self.send(websocket, 'USER', frame)
+
+    async def revalue(self, changed, traded):
+        """Reloads the valuations of the users who traded, returns the frames of the users whose value changed"""
+        frames = {}
+        for user in set(self.profits.values()):
+            if user.id in traded:
+                self.valuations[user.id] = await get_valuation(user)
+            if user.id in traded or self.valuations[user.id].holds(changed):
+                frames[user.id] = self.valuations[user.id].frame(self.prices)
+        return frames
+
+    async def tick(self, changed):
+        traded, self.traded = self.traded, set()
+        if self.subscribers or self.topics or self.profits or self.deltas:
+            seq = self.seq
+            await self.load()
+            if not self.push and changed is not None:
+                # polled : the coins whose price changed since the last tick, all of them when the catalog changed
+                changed = None if self.delta is None else changed | {coin[0] for coin in self.delta}
+            shared = self.shared
+            sends = [self.send_all(websocket, user, shared) for websocket, user in list(self.subscribers.items())]
+            for websocket, user in list(self.deltas.items()):
+                if self.seq != seq:
+                    self.send_delta(websocket)
+                sends.append(self.send_user(websocket, user))
+            for name, subscribers in list(self.topics.items()):
+                if name in self.by_name and (changed is None or name in changed):
+                    coin = self.by_name[name]
+                    shared = json.dumps(coin)
+                    sends += [self.send_topic(websocket, user, coin, shared) for websocket, user in list(subscribers.items())]
+            await asyncio.gather(*sends)
+            frames = await self.revalue(changed, traded)
+            for websocket, user in list(self.profits.items()):
+                if user.id in frames:
+                    self.send(websocket, 'PROFIT', frames[user.id])
+        else:
+            self.shared = None
+
+    async def wait_for_change(self):
+        if not self.push:
+            await asyncio.sleep(self.interval)
+        else:
+            await asyncio.sleep(self.min_interval)
+            await self.dirty.wait()
+            self.dirty.clear()
+        changed, self.pending = self.pending, set()
+        return changed
+
+    async def listen(self):
+        """Collects the coins diffs in push mode and the users who traded"""
+        channels = [settings.TRADES_CHANNEL]
+        if self.push:
+            channels.append(settings.COINS_CHANNEL)
+        while True:
+            try:
+                pubsub = aioredis.from_url(settings.REDIS_URL).pubsub()
+                await pubsub.subscribe(*channels)
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    data = json.loads(message['data'])
+                    if message['channel'].decode() == settings.TRADES_CHANNEL:
+                        self.traded.add(data['user'])
+                        self.pending.update(data['coins'])
+                    else:
+                        self.pending.update(coin['Name'] for coin in data['coins'])
+                    self.dirty.set()
+            except aioredis.RedisError as e:
+                logging.warning('%s, resubscribing to %s', e, ', '.join(channels))
+                await asyncio.sleep(1)
+
+    async def run(self):
+        self.listener = asyncio.create_task(self.listen())
+        while True:
+            changed = await self.wait_for_change()
+            try:
+                await self.tick(changed)
+            except Exception:
+                logging.exception('broadcast tick failed')
 
 
-@sync_to_async
-def get_coin(name):
+async def socket(websocket, user):
+    try:
+        await broadcaster.subscribe(websocket, user)
+        await websocket.wait_closed()
+    finally:
+        broadcaster.unsubscribe(websocket)
+
+
+async def delta_socket(websocket, user, options):
+    """
+    ALL DELTA [MSGPACK] : snapshot frame on subscribe, then delta frames with [Name, Price, ChangePct]
+    of the changed coins, send RESYNC to get a new snapshot when a seq is missed
+    """
+    if options not in (['DELTA'], ['DELTA', 'MSGPACK']):
+        await websocket.send('invalid request')
+        return
     try:
-        return Coin.objects.get(Name = name)
-    except:
-        return False
+        await broadcaster.subscribe_delta(websocket, user, 'MSGPACK' in options)
+        async for message in websocket:
+            if message == 'RESYNC':
+                broadcaster.resync(websocket)
+    except websockets.ConnectionClosed:
+        return
+    finally:
+        broadcaster.unsubscribe_delta(websocket)
 
 
-@sync_to_async
-def get_wallet_amount(user):
-    try:
-        return user.wallet.amount
-    except:
-        return 0
+async def subscribe_coins(websocket, user, req):
+    """Handles comma separated coin names, a name prefixed with - is unsubscribed"""
+    valid = True
+    for name in req.split(','):
+        name = name.strip()
+        if name.startswith('-'):
+            broadcaster.unsubscribe_topic(websocket, name[1:])
+        elif not await broadcaster.subscribe_topic(websocket, user, name):
+            valid = False
+    return valid
 
 
-@sync_to_async
-def get_holdings(user):
+async def single_socket(websocket, user, req):
     try:
-        return user.my_holdings.MyHoldings
-    except:
-        return []
+        if not await subscribe_coins(websocket, user, req):
+            await websocket.send('invalid request')
+            if not any(websocket in subscribers for subscribers in broadcaster.topics.values()):
+                return
+        async for message in websocket:
+            if not await subscribe_coins(websocket, user, message):
+                await websocket.send('invalid request')
+    except websockets.ConnectionClosed:
+        return
+    finally:
+        broadcaster.unsubscribe_topic(websocket)
 
 
 async def profit_socket(websocket, user):
     try:
-        while True:
-            wallet = await get_wallet_amount(user)
-            holdings_list = await get_holdings(user)
-            holdings_value = 0
-            for holding in holdings_list:
-                curcoin = await get_coin(holding[0])
-                holdings_value += round((float(holding[1]) * curcoin.Price), 8)
-            await websocket.send(json.dumps({'wallet': wallet, 'holdings_value' : holdings_value, 'total' : wallet+holdings_value}))
-            await asyncio.sleep(10)
-    except:
-        return
+        await broadcaster.subscribe_profit(websocket, user)
+        await websocket.wait_closed()
+    finally:
+        broadcaster.unsubscribe_profit(websocket)
 
 
 async def handler(websocket, user):
     await websocket.send('authorised, enter ALL or name of the coin ,PROFIT to get current holdings')
     req = await websocket.recv()
-    global connections
-    connections += 1
-    if connections == 1:
-        await AddToCeleryBeat()
-    if req == 'ALL':
-        # await websocket.send('enter in format : ', json.dumps({'sorting' : 'Name, Price, ChangePct', 'order' : 'asc, dsc'}))
-        # await websocket.recv()
-        await socket(websocket, user)
-    elif req == 'PROFIT':
-        await profit_socket(websocket, user)
-    else:
-        coin = await get_coin(req)
-        if not coin:
-            await websocket.send('invalid request')
-        await single_socket(websocket, user, req)
-    connections -= 1
-    if connections == 0:
-        await RemoveFromCeleryBeat()
-
-
-@sync_to_async
-def get_user(tokenset):
-    return User.objects.get(id = tokenset['user_id'])
+    await registry.connect()
+    broadcaster.attach(websocket)
+    try:
+        if req == 'ALL':
+            # await websocket.send('enter in format : ', json.dumps({'sorting' : 'Name, Price, ChangePct', 'order' : 'asc, dsc'}))
+            # await websocket.recv()
+            await socket(websocket, user)
+        elif req.startswith('ALL '):
+            await delta_socket(websocket, user, req.split()[1:])
+        elif req == 'PROFIT':
+            await profit_socket(websocket, user)
+        else:
+            await single_socket(websocket, user, req)
+    finally:
+        broadcaster.remove(websocket)
+        await registry.disconnect()
+
+
+@database
+def get_users(ids):
+    return User.objects.in_bulk(ids)
+
+
+class AuthCache:
+    """
+    Users of verified tokens, kept until the token expires so a reconnecting client skips
+    jwt.decode and the database. Users missing from the cache are loaded together, with
+    one query for all the tokens verified within window seconds.
+    """
+
+    def __init__(self, window = 0.005):
+        self.window = window
+        self.tokens = {}
+        self.waiting = {}
+        self.purged = time.time()
+
+    def purge(self, now):
+        self.tokens = {token: entry for token, entry in self.tokens.items() if entry[1] > now}
+        self.purged = now
+
+    async def authenticate(self, token):
+        now = time.time()
+        if now - self.purged > 60:
+            self.purge(now)
+        if token in self.tokens and self.tokens[token][1] > now:
+            return self.tokens[token][0]
+        tokenset = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+        user = await self.load(tokenset['user_id'])
+        self.tokens[token] = (user, tokenset['exp'])
+        return user
+
+    async def load(self, id):
+        if not self.waiting:
+            asyncio.create_task(self.flush())
+        if id not in self.waiting:
+            self.waiting[id] = asyncio.get_running_loop().create_future()
+            # retrieve the exception even when every waiter has disconnected
+            self.waiting[id].add_done_callback(lambda future: future.cancelled() or future.exception())
+        return await asyncio.shield(self.waiting[id])
+
+    async def flush(self):
+        await asyncio.sleep(self.window)
+        waiting, self.waiting = self.waiting, {}
+        try:
+            users = await get_users(list(waiting))
+        except Exception as e:
+            logging.warning('%s, loading users %s', e, list(waiting))
+            for future in waiting.values():
+                future.set_exception(e)
+            return
+        for id, future in waiting.items():
+            if id in users:
+                future.set_result(users[id])
+            else:
+                future.set_exception(User.DoesNotExist())
 
 
 async def authorise(websocket):
     await websocket.send('connection established, send token to recieve data')    
     token = await websocket.recv()
     try: 
-        tokenset = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-        user = await get_user(tokenset)
-    except:
+        user = await auth_cache.authenticate(token)
+    except (jwt.InvalidTokenError, KeyError, User.DoesNotExist):
         await websocket.send('invalid token')
         return
+    except Exception:
+        await websocket.close(1011, 'internal error')
+        return
     await handler(websocket, user)
 
 
-async def main():
-    async with websockets.serve(authorise, port = 8001):
-        await asyncio.Future()
+async def drain(server):
+    """Stops accepting connections and asks the clients to reconnect, which lands them on the other workers"""
+    server.server.close()
+    await asyncio.gather(*(websocket.close(1012, 'reconnect') for websocket in list(server.websockets)), return_exceptions = True)
 
 
-connections = 0
-asyncio.run(main())
\ No newline at end of file
+def stopped(task, stop):
+    """A background task ended, stops the worker so its clients reconnect to a healthy one"""
+    if task.cancelled():
+        return
+    logging.critical('%s task stopped', task.get_name(), exc_info = task.exception())
+    stop.done() or stop.set_result(None)
+
+
+async def main(reuse_port = False):
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, lambda: stop.done() or stop.set_result(None))
+        except NotImplementedError:
+            pass
+    tasks = [asyncio.create_task(broadcaster.run(), name = 'broadcaster'), asyncio.create_task(registry.run(), name = 'registry')]
+    for task in tasks:
+        task.add_done_callback(lambda task: stopped(task, stop))
+    async with websockets.serve(authorise, port = 8001, ping_interval = settings.WEBSOCKET_HEARTBEAT, reuse_port = reuse_port,
+                                **compression_options(settings.WEBSOCKET_COMPRESSION)) as server:
+        await stop
+        await drain(server)
+
+
+def serve(reuse_port = False):
+    global registry, broadcaster, auth_cache
+    registry = SubscriberRegistry(settings.WEBSOCKET_REGISTRY_TTL)
+    auth_cache = AuthCache()
+    broadcaster = Broadcaster(settings.WEBSOCKET_INTERVAL, settings.WEBSOCKET_PUSH, settings.WEBSOCKET_MIN_INTERVAL,
+                              settings.WEBSOCKET_MAX_PENDING, settings.WEBSOCKET_SLOW_CLIENT_TIMEOUT)
+    asyncio.run(main(reuse_port))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'cryptBEE websocket server')
+    parser.add_argument('--workers', type = int, default = settings.WEBSOCKET_WORKERS,
+                        help = 'number of worker processes sharing port 8001 through SO_REUSEPORT')
+    args = parser.parse_args()
+    if args.workers <= 1:
+        serve()
+    else:
+        workers = [multiprocessing.Process(target = serve, args = (True,)) for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: [worker.terminate() for worker in workers])
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for worker in workers:
+            worker.join()
\ No newline at end of file